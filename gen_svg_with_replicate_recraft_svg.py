@@ -3,24 +3,37 @@ import os
 import sys
 import time
 import requests
+from image_download import RateLimiter, session, stream_download
 import argparse
 import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-def get_unique_filename(basename):
-    filename = f"{basename}.svg"
-    counter = 1
-    while os.path.exists(filename):
-        filename = f"{basename}{counter}.svg"
-        counter += 1
-    return filename
+DEFAULT_API_URL = "https://api.replicate.com/v1/models/recraft-ai/recraft-v3-svg/predictions"
+
+def reserve_unique_filename(basename):
+    """Atomically create and return the first free of basename.svg, basename1.svg, ...
+
+    The file is created empty with O_EXCL, so concurrent workers (or other
+    runs) can never be handed the same name; the download later replaces it.
+    """
+    counter = 0
+    while True:
+        filename = f"{basename}{counter or ''}.svg"
+        try:
+            os.close(os.open(filename, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644))
+            return filename
+        except FileExistsError:
+            counter += 1
 
 def download_image(url, filename):
-    response = requests.get(url)
-    with open(filename, 'wb') as f:
-        f.write(response.content)
+    """Stream the SVG at url over filename (replacing the reserved placeholder atomically)."""
+    def path_for_format(ext):
+        if ext != 'svg':
+            raise ValueError(f"expected an SVG, got {ext}")
+        return filename
+    stream_download(url, path_for_format)
 
-def create_prediction(prompt, token):
-    url = "https://api.replicate.com/v1/models/recraft-ai/recraft-v3-svg/predictions"
+def create_prediction(prompt, token, api_url=DEFAULT_API_URL):
     headers = {
         "Authorization": f"Bearer {token}",
         "Content-Type": "application/json",
@@ -34,19 +47,40 @@ def create_prediction(prompt, token):
         }
     }
 
-    response = requests.post(url, headers=headers, json=data)
+    response = session().post(api_url, headers=headers, json=data)
     response.raise_for_status()
 
     return response.json()['output']
 
+def generate(i, args, limiter, downloads):
+    """Create prediction i and hand its download to the download pool."""
+    limiter.wait()
+    logging.info(f"Generating image {i+1} of {args.n}...")
+    image_url = create_prediction(args.prompt, args.token, args.api_url)
+    return downloads.submit(save_image, image_url, args.basename)
+
+def save_image(image_url, basename):
+    filename = reserve_unique_filename(basename)
+    try:
+        download_image(image_url, filename)
+    except BaseException:
+        os.remove(filename)
+        raise
+    logging.info(f"Image downloaded as {filename}.")
+    return filename
+
 def main():
     parser = argparse.ArgumentParser(description="Generate SVG images using Recraft API.")
     parser.add_argument("prompt", type=str, help="Prompt used to generate SVG images.")
     parser.add_argument("-n", type=int, default=1, help="Number of generations to create.")
-    parser.add_argument("-S", "--sleep", type=int, default=0, help="Sleep time in seconds between generations.")
+    parser.add_argument("-S", "--sleep", type=float, default=0, help="Minimum time in seconds between starting generations.")
+    parser.add_argument("-w", "--workers", type=int, default=1, help="Number of generations in flight at once.")
+    parser.add_argument("-r", "--rpm", type=float, help="Limit prediction requests per minute (overrides --sleep when stricter).")
     parser.add_argument("-t", "--token", type=str, default=os.getenv('REPLICATE_API_TOKEN'), help="API token for authorization.")
     parser.add_argument("-v", "--verbose", action='count', default=0, help="Increase output verbosity, e.g. -vv for more verbose.")
     parser.add_argument("--basename", type=str, default="output", help="Basename for the generated files.")
+    parser.add_argument("--api-url", default=DEFAULT_API_URL,
+                        help="Predictions endpoint, e.g. a local misc/replicate_stub_server.py for benchmarking.")
 
     args = parser.parse_args()
 
@@ -57,21 +91,25 @@ def main():
     log_level = logging.WARNING - (args.verbose * 10)
     logging.basicConfig(level=log_level)
 
-    for i in range(args.n):
-        logging.info(f"Generating image {i+1} of {args.n}...")
-        try:
-            image_url = create_prediction(args.prompt, args.token)
-            filename = get_unique_filename(args.basename)
-            download_image(image_url, filename)
-            logging.info(f"Image downloaded as {filename}.")
-        except requests.RequestException as e:
-            logging.error(f"Error during request: {e}")
-        except Exception as e:
-            logging.error(f"An unexpected error occurred: {e}")
-
-        if i < args.n - 1:
-            logging.info(f"Sleeping for {args.sleep} seconds...")
-            time.sleep(args.sleep)
+    interval = max(args.sleep, 60 / args.rpm if args.rpm else 0)
+    limiter = RateLimiter(interval)
+    started = time.monotonic()
+    failed = 0
+    # Predictions run on one pool and downloads on another, so a worker starts
+    # its next prediction while the previous image is still downloading.
+    with ThreadPoolExecutor(max_workers=args.workers) as downloads, \
+            ThreadPoolExecutor(max_workers=args.workers) as generations:
+        futures = [generations.submit(generate, i, args, limiter, downloads) for i in range(args.n)]
+        for future in as_completed(futures):
+            try:
+                print(future.result().result(), flush=True)
+            except requests.RequestException as e:
+                failed += 1
+                logging.error(f"Error during request: {e}")
+            except Exception as e:
+                failed += 1
+                logging.error(f"An unexpected error occurred: {e}")
+    logging.info(f"{args.n - failed} of {args.n} images in {time.monotonic() - started:.1f}s")
 
 if __name__ == "__main__":
     main()
@@ -86,7 +124,8 @@ if __name__ == "__main__":
 #    - Uses `os.getenv` to get the `REPLICATE_API_TOKEN` if not provided via the `-t` flag.
 # 
 # 3. **Filename Handling**:
-#    - Uses a function to find a unique filename by incrementing a counter if the desired file already exists.
+#    - Reserves the first free filename by creating it with O_EXCL, incrementing a counter if the desired file already exists,
+#      so concurrent workers never write to the same file.
 # 
 # 4. **HTTP Request**:
 #    - Uses `requests` to interact with the API. The generated SVG is downloaded directly to a file.
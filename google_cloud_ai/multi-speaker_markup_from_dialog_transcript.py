@@ -4,10 +4,24 @@
 # https://cloud.google.com/text-to-speech/docs/create-dialogue-with-multispeakers
 
 import argparse
+import hashlib
+import json
+import math
+import re
+import shutil
+import struct
 import sys
 import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
 from google.cloud import texttospeech
 
+# The shared helpers live in the repository root, one level up.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
+from script_cache import cache_dir
+from tts_audio import ffmpeg_concat, is_anchor, strip_id3
+
 def log_verbose(message, *format_args):
     if args.verbose:
         print(message.format(*format_args), file=sys.stderr)
@@ -49,14 +63,132 @@ def parse_input(input_file):
 def choose_audio_encoding():
     return get_audio_encoding(args.encoding) if args.encoding else texttospeech.AudioEncoding.MP3
 
-def generate_audio(turns):
-    client = texttospeech.TextToSpeechClient()
-    
+CACHE_DIR = cache_dir("google_dialog")
+
+# Google limits the text of one synthesis request to 5000 bytes; stay below it.
+MAX_GROUP_BYTES = 4000
+
+def split_turn(turn, max_bytes):
+    """Split an oversized turn into turns of the same speaker at sentence (or word) boundaries."""
+    pieces = []
+    current = ""
+    for word in re.split(r"(?<=[.!?])\s+", turn.text):
+        for part in ([word] if len(word.encode()) <= max_bytes else word.split()):
+            candidate = f"{current} {part}" if current else part
+            if current and len(candidate.encode()) > max_bytes:
+                pieces.append(current)
+                candidate = part
+            current = candidate
+    if current:
+        pieces.append(current)
+    turns = []
+    for text in pieces:
+        piece = texttospeech.MultiSpeakerMarkup.Turn()
+        piece.text = text
+        piece.speaker = turn.speaker
+        turns.append(piece)
+    return turns
+
+def group_turns(turns, max_bytes=MAX_GROUP_BYTES):
+    """Pack consecutive turns into groups whose text stays under max_bytes per request.
+
+    Groups also end after "anchor" turns chosen by their content hash, so
+    group boundaries depend only on nearby turns. Editing a turn changes
+    the groups between the anchors before and after it (and up to the
+    anchor after that if the edited turn gains or loses anchor status);
+    the cached audio of the other groups stays valid.
+    """
+    groups = [[]]
+    size = 0
+    for turn in turns:
+        for piece in split_turn(turn, max_bytes) if len(turn.text.encode()) > max_bytes else [turn]:
+            piece_size = len(piece.text.encode())
+            if groups[-1] and size + piece_size > max_bytes:
+                groups.append([])
+                size = 0
+            groups[-1].append(piece)
+            size += piece_size
+            if is_anchor(f"{piece.speaker}:{piece.text}", 8):
+                groups.append([])
+                size = 0
+    return [group for group in groups if group]
+
+def group_cache_path(cache_dir, group, voice, audio_encoding, namespace="google"):
+    """Cache file for the audio of one turn group, keyed by voice, encoding, speakers and texts."""
+    key = hashlib.sha256(json.dumps([namespace, voice.language_code, voice.name, int(audio_encoding),
+                                     [[turn.speaker, turn.text] for turn in group]]).encode()).hexdigest()
+    return os.path.join(cache_dir, key[:2], key + ".audio")
+
+def synthesize_group(client, turns, voice, audio_config):
     multi_speaker_markup = texttospeech.MultiSpeakerMarkup()
     multi_speaker_markup.turns.extend(turns)
-    
     synthesis_input = texttospeech.SynthesisInput(multi_speaker_markup=multi_speaker_markup)
-    
+    response = client.synthesize_speech(
+        input=synthesis_input, voice=voice, audio_config=audio_config
+    )
+    return response.audio_content
+
+def wav_parts(data):
+    """Return (fmt chunk payload, sample data) of a RIFF/WAVE byte string.
+
+    Streaming encoders may leave the size fields at 0 or 0xFFFFFFFF, so the
+    data chunk is clamped to the bytes actually present.
+    """
+    fmt = None
+    pos = 12
+    while pos + 8 <= len(data):
+        chunk_id = data[pos:pos + 4]
+        size = struct.unpack("<I", data[pos + 4:pos + 8])[0]
+        body = pos + 8
+        if chunk_id == b"fmt ":
+            fmt = data[body:body + size]
+        elif chunk_id == b"data":
+            end = len(data) if size in (0, 0xFFFFFFFF) else min(body + size, len(data))
+            return fmt, data[body:end]
+        pos = body + size + (size & 1)
+    raise ValueError("no data chunk in WAV audio")
+
+def join_wav(parts):
+    """Concatenate the samples of WAV byte strings under one RIFF header."""
+    fmt = None
+    samples = []
+    for part in parts:
+        part_fmt, data = wav_parts(part)
+        if fmt is None:
+            fmt = part_fmt
+        elif part_fmt != fmt:
+            raise ValueError("WAV parts have different formats")
+        samples.append(data)
+    data = b"".join(samples)
+    return (b"RIFF" + struct.pack("<I", 4 + 8 + len(fmt) + 8 + len(data)) + b"WAVE"
+            + b"fmt " + struct.pack("<I", len(fmt)) + fmt
+            + b"data" + struct.pack("<I", len(data)) + data)
+
+def join_audio(parts, audio_encoding):
+    """Join the audio of consecutive groups in order, without re-encoding."""
+    if len(parts) == 1:
+        return parts[0]
+    if all(part[:4] == b"RIFF" for part in parts):
+        # LINEAR16, MULAW and ALAW come as WAV: concatenate the samples
+        return join_wav(parts)
+    if audio_encoding == texttospeech.AudioEncoding.MP3:
+        return parts[0] + b"".join(strip_id3(part) for part in parts[1:])
+    if audio_encoding == texttospeech.AudioEncoding.OGG_OPUS and shutil.which("ffmpeg"):
+        return ffmpeg_concat(parts, "ogg")
+    if audio_encoding == texttospeech.AudioEncoding.OGG_OPUS:
+        print("WARNING: ffmpeg not found, writing the Ogg parts as a chained stream", file=sys.stderr)
+    return b"".join(parts)
+
+def generate_audio(turns, client=None, workers=4, max_group_bytes=MAX_GROUP_BYTES, cache_dir=None):
+    """Synthesise the dialogue as size-bounded groups of turns in parallel and join them in order.
+
+    With `cache_dir`, groups whose audio is cached are not sent again and
+    every newly synthesised group is stored there.
+    """
+    if client is None:
+        client = texttospeech.TextToSpeechClient()
+    namespace = "fake" if isinstance(client, FakeTextToSpeechClient) else "google"
+
     voice = texttospeech.VoiceSelectionParams(
         language_code="en-US", name="en-US-Studio-MultiSpeaker"
     )
@@ -65,12 +197,79 @@ def generate_audio(turns):
     encoding_str = next(key for key, value in encoding_map.items() if value == audio_encoding)
     log_verbose("DEB:Chosen audio encoding: {}", encoding_str)
     audio_config = texttospeech.AudioConfig(audio_encoding=audio_encoding)
-    
-    response = client.synthesize_speech(
-        input=synthesis_input, voice=voice, audio_config=audio_config
-    )
-    
-    return response.audio_content
+
+    groups = group_turns(turns, max_group_bytes)
+    log_verbose("DEB:{} turns in {} requests", len(turns), len(groups))
+
+    def render(group):
+        path = group_cache_path(cache_dir, group, voice, audio_encoding, namespace) if cache_dir else None
+        if path and os.path.exists(path):
+            with open(path, "rb") as f:
+                return f.read(), True
+        audio = synthesize_group(client, group, voice, audio_config)
+        if path:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(audio)
+            os.replace(tmp, path)
+        return audio, False
+
+    # Identical groups (e.g. a repeated "Yeah.") are synthesised once.
+    unique = {}
+    keys = []
+    for group in groups:
+        key = tuple((turn.speaker, turn.text) for turn in group)
+        unique.setdefault(key, group)
+        keys.append(key)
+
+    # The client is shared: one channel serves all concurrent requests.
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        rendered = dict(zip(unique, executor.map(render, unique.values())))
+    results = [rendered[key] for key in keys]
+    if cache_dir:
+        log_verbose("DEB:{} of {} distinct groups from cache", sum(hit for _, hit in rendered.values()), len(rendered))
+    return join_audio([audio for audio, _ in results], audio_encoding)
+
+class FakeTextToSpeechClient:
+    """Local stand-in for TextToSpeechClient, for testing without Google credentials.
+
+    Answers each request after `latency` seconds with a tone per speaker
+    (0.25s per word) in the requested encoding: WAV for LINEAR16, MULAW
+    and ALAW, silent frames for MP3.
+    """
+
+    def __init__(self, latency=0.5):
+        self.latency = latency
+
+    def synthesize_speech(self, input, voice, audio_config):
+        time.sleep(self.latency)
+        turns = input.multi_speaker_markup.turns
+        seconds = [0.25 * len(turn.text.split()) for turn in turns]
+        encoding = audio_config.audio_encoding
+        if encoding == texttospeech.AudioEncoding.MP3:
+            # 128kbps 44.1kHz MPEG-1 Layer III frames of zeros decode as silence
+            frame = b"\xff\xfb\x90\x64" + bytes(413)
+            audio = frame * int(sum(seconds) * 44100 / 1152)
+        elif encoding in (texttospeech.AudioEncoding.LINEAR16, texttospeech.AudioEncoding.MULAW,
+                          texttospeech.AudioEncoding.ALAW):
+            linear = encoding == texttospeech.AudioEncoding.LINEAR16
+            rate, width = (24000, 2) if linear else (8000, 1)
+            samples = bytearray()
+            for turn, duration in zip(turns, seconds):
+                # One 10ms period of the speaker's tone, repeated for the turn
+                freq = 100 * (2 + ord(turn.speaker[0]) % 8)
+                period = [int(8000 * math.sin(2 * math.pi * freq * n / rate)) for n in range(rate // 100)]
+                cycle = struct.pack(f"<{len(period)}h", *period) if linear else bytes((v >> 8) & 0xFF for v in period)
+                samples += cycle * int(duration * 100)
+            fmt_code = {texttospeech.AudioEncoding.LINEAR16: 1, texttospeech.AudioEncoding.ALAW: 6,
+                        texttospeech.AudioEncoding.MULAW: 7}[encoding]
+            fmt = struct.pack("<HHIIHH", fmt_code, 1, rate, rate * width, width, 8 * width)
+            audio = join_wav([b"RIFF\0\0\0\0WAVE" + b"fmt " + struct.pack("<I", len(fmt)) + fmt
+                              + b"data" + struct.pack("<I", len(samples)) + bytes(samples)])
+        else:
+            raise ValueError("the fake client only produces LINEAR16, MULAW, ALAW and MP3")
+        return texttospeech.SynthesizeSpeechResponse(audio_content=audio)
 
 encoding_map = {
     "LINEAR16": texttospeech.AudioEncoding.LINEAR16,
@@ -105,6 +304,15 @@ def main():
     parser.add_argument("-n", "--dry-run", action="store_true", help="Run the script without generating or writing audio")
     parser.add_argument("-e", "--encoding", default=None, help="Audio encoding (wav, mp3, ogg, mulaw, alaw)")
     parser.add_argument("-o", "--output", default=None, help="Output file (default is input filename with appropriate extension)")
+    parser.add_argument("-w", "--workers", type=int, default=4, help="Concurrent synthesis requests [4]")
+    parser.add_argument("--max-group-bytes", type=int, default=MAX_GROUP_BYTES,
+                        help="Maximum text bytes of the turns sent in one request [{}]".format(MAX_GROUP_BYTES))
+    parser.add_argument("-I", "--incremental", action="store_true",
+                        help="Re-render over an existing output file; only turn groups edited since the cached render are synthesised again")
+    parser.add_argument("--no-cache", action="store_false", dest="cache", help="Don't reuse or store the audio of turn groups")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help="Turn group audio cache [{}]".format(CACHE_DIR))
+    parser.add_argument("--fake-client", nargs="?", type=float, const=0.5, metavar="LATENCY",
+                        help="Use a local fake TTS service answering after LATENCY seconds [0.5] instead of Google")
     args = parser.parse_args()
 
     args.speakers = args.speakers.split(',')
@@ -117,9 +325,9 @@ def main():
         if not args.encoding:
             args.encoding = os.path.splitext(output_file)[1][1:]
     else:
-        output_file = args.input + "." + args.encoding if args.encoding else ".mp3"
+        output_file = args.input + "." + (args.encoding or "mp3")
 
-    if os.path.exists(output_file):
+    if os.path.exists(output_file) and not args.incremental:
         print(f"SKIPPING:ALREADY_EXISTS:{output_file}")
         sys.exit(1)
 
@@ -128,7 +336,9 @@ def main():
     
     if not args.dry_run:
         log_verbose("Generating audio")
-        audio_content = generate_audio(turns)
+        client = FakeTextToSpeechClient(args.fake_client) if args.fake_client is not None else None
+        audio_content = generate_audio(turns, client, args.workers, args.max_group_bytes,
+                                       args.cache_dir if args.cache else None)
 
         log_verbose(f"Writing audio to {output_file}")
         with open(output_file, "wb") as out:
@@ -154,6 +364,9 @@ if __name__ == "__main__":
 # 6. It writes the generated audio to the output file.
 # 7. It includes verbose logging when the -v flag is used.
 # 8. It includes a dry-run mode that runs the script without generating or writing audio when the -n flag is used.
+# 9. Long dialogues are sent as several requests of at most --max-group-bytes of text, synthesised concurrently (-w) and joined in order;
+#    --fake-client replaces the Google service with a local stand-in for testing.
+# 10. The audio of each turn group is cached, so with -I/--incremental an edited script re-renders only the changed groups.
 # 
 # To use this script, you would run it like this:
 # 
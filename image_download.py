@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+
+# Shared streaming downloader and request rate limiter for the image
+# generation scripts next to this file (replicate_com_flux_schnell.py and
+# gen_svg_with_replicate_recraft_svg.py).
+#
+# Bodies are streamed in chunks instead of being held in memory. The
+# format is sniffed from the first chunk, so the final file name is known
+# before the rest arrives. Data goes to a temp file next to the target
+# and is renamed into place only when complete, so an interrupted
+# download never leaves a truncated image behind.
+
+import os
+import re
+import tempfile
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+CHUNK_SIZE = 64 * 1024
+
+# Bytes needed before sniff_format() can decide; SVG may start with an XML
+# declaration, comments or a doctype before the <svg tag.
+SNIFF_BYTES = 1024
+
+_local = threading.local()
+
+
+class RateLimiter:
+    """Spaces out calls so that at most one starts per `interval` seconds, across threads."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.next_start = time.monotonic()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_start)
+            self.next_start = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+def session():
+    """A pooled requests.Session per thread, reusing connections across downloads."""
+    if not hasattr(_local, "session"):
+        s = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+        s.mount("https://", adapter)
+        s.mount("http://", adapter)
+        _local.session = s
+    return _local.session
+
+
+def sniff_format(head):
+    """File extension for the leading bytes of an image: png, jpg, webp, svg or 'unknown'."""
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png'
+    if head.startswith(b'\xFF\xD8'):
+        return 'jpg'
+    if head.startswith(b'RIFF') and head[8:12] == b'WEBP':
+        return 'webp'
+    if re.match(rb'(\xef\xbb\xbf)?\s*(<\?xml[^>]*>\s*|<!--.*?-->\s*|<!DOCTYPE[^>]*>\s*)*<svg[\s>]', head, re.S | re.I):
+        return 'svg'
+    return 'unknown'
+
+
+def stream_download(url, path_for_format, chunk_size=CHUNK_SIZE, timeout=60):
+    """Stream url to disk and return the final path.
+
+    `path_for_format(ext)` maps the sniffed extension to the destination
+    path. It may raise ValueError to reject a format. The body is written
+    to a temp file in the destination directory and renamed over the
+    destination once complete.
+    """
+    with session().get(url, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        chunks = response.iter_content(chunk_size)
+        head = b""
+        for chunk in chunks:
+            head += chunk
+            if len(head) >= SNIFF_BYTES:
+                break
+        ext = sniff_format(head)
+        if ext == 'unknown':
+            raise ValueError("Unable to determine file format.")
+        path = path_for_format(ext)
+
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=".download-", suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(head)
+                for chunk in chunks:
+                    f.write(chunk)
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, path)
+        except BaseException:
+            os.remove(tmp)
+            raise
+    return path
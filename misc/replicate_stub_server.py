@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+
+# Local stand-in for the Replicate predictions API, for benchmarking the
+# generation scripts without spending credits.
+#
+# Every POST to any path answers like a synchronous ("Prefer: wait")
+# prediction after --latency seconds, with "output" pointing at a small
+# SVG (or PNG with --png) served by this server after --download-latency
+# seconds.
+#
+# Example benchmark:
+#   ./misc/replicate_stub_server.py --latency 2 &
+#   time ./gen_svg_with_replicate_recraft_svg.py -t x -n 20 --api-url http://127.0.0.1:8765/predictions "cat"
+#   time ./gen_svg_with_replicate_recraft_svg.py -t x -n 20 -w 8 --api-url http://127.0.0.1:8765/predictions "cat"
+
+import argparse
+import itertools
+import json
+import threading
+import struct
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+def tiny_png():
+    """A valid 1x1 white grayscale PNG, served for output paths ending in .png."""
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    header = struct.pack(">IIBBBBB", 1, 1, 8, 0, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(b"\x00\xff")) + chunk(b"IEND", b"")
+
+PNG = tiny_png()
+SVG = b'<svg xmlns="http://www.w3.org/2000/svg" width="64" height="64"><circle cx="32" cy="32" r="30"/></svg>\n'
+
+def make_handler(args):
+    counter = itertools.count(1)
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *log_args):
+            if args.verbose:
+                super().log_message(format, *log_args)
+
+        def reply(self, status, body, content_type):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            with lock:
+                prediction_id = next(counter)
+            time.sleep(args.latency)
+            host, port = self.server.server_address[:2]
+            output = f"http://{host}:{port}/files/{prediction_id}.{'png' if args.png else 'svg'}"
+            body = {"id": str(prediction_id), "input": request.get("input", {}), "status": "succeeded",
+                    "output": [output] if args.list_output else output}
+            self.reply(201, json.dumps(body).encode(), "application/json")
+
+        def do_GET(self):
+            if not self.path.startswith("/files/"):
+                self.reply(404, b"not found\n", "text/plain")
+                return
+            time.sleep(args.download_latency)
+            if self.path.endswith(".png"):
+                self.reply(200, PNG, "image/png")
+            else:
+                self.reply(200, SVG, "image/svg+xml")
+
+    return Handler
+
+def main():
+    parser = argparse.ArgumentParser(description="Stand-in Replicate predictions server for local benchmarks.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=2.0, help="Seconds each prediction takes")
+    parser.add_argument("--download-latency", type=float, default=0.2, help="Seconds each file download takes")
+    parser.add_argument("--list-output", action="store_true", help="Return output as a list of URLs (like flux-schnell)")
+    parser.add_argument("--png", action="store_true", help="Point outputs at PNG images instead of SVG")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Log every request")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(args))
+    print(f"Serving stub predictions on http://{args.host}:{args.port}/ (latency {args.latency}s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+
+# Watch the clipboard and print (and optionally translate) every new text.
+#
+# Instead of forking `xclip -o` every 200ms, the watcher asks the X server
+# for XFixes SetSelectionOwnerNotify events on CLIPBOARD and sleeps in the
+# event loop until one arrives, so an idle watcher uses no CPU. The
+# clipboard is read once per ownership change. Without python-xlib or
+# XFixes it falls back to polling every --interval seconds.
+#
+# Texts are de-duplicated by hash against the previous one. With
+# --translate, new texts go through an async queue to the translation
+# command; copies arriving within --debounce seconds of each other are
+# collapsed into the last one, and translations are cached by command
+# and text.
+#
+# Example:
+#   ./monitor_clipboard_and_translate.py --translate "./deepl EN DE"
+
+import argparse
+import asyncio
+import hashlib
+import os
+import shlex
+import sys
+import tempfile
+from script_cache import cache_dir
+
+try:
+    from Xlib import display as xdisplay
+    from Xlib.ext import xfixes
+except ModuleNotFoundError:
+    xdisplay = None
+
+CACHE_DIR = cache_dir("clipboard_translate")
+
+READ_CLIPBOARD = ["xclip", "-selection", "clipboard", "-o"]
+
+
+def text_digest(text):
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+async def read_clipboard():
+    """Current clipboard text, or None if it holds no text."""
+    proc = await asyncio.create_subprocess_exec(
+        *READ_CLIPBOARD, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL)
+    out, _ = await proc.communicate()
+    if proc.returncode != 0:
+        return None
+    return out.decode(errors="replace")
+
+
+def watch_xfixes(loop, changes):
+    """Put a token into `changes` on every CLIPBOARD owner change; False if XFixes is unavailable."""
+    if xdisplay is None:
+        return False
+    try:
+        d = xdisplay.Display()
+    except Exception:
+        return False
+    if not d.has_extension("XFIXES"):
+        d.close()
+        return False
+    d.xfixes_query_version()
+    d.xfixes_select_selection_input(d.screen().root, d.get_atom("CLIPBOARD"),
+                                    xfixes.XFixesSetSelectionOwnerNotifyMask)
+    d.flush()
+
+    def on_readable():
+        while d.pending_events():
+            if isinstance(d.next_event(), xfixes.SetSelectionOwnerNotify):
+                changes.put_nowait(None)
+
+    loop.add_reader(d.fileno(), on_readable)
+    return True
+
+
+async def poll(changes, interval):
+    while True:
+        changes.put_nowait(None)
+        await asyncio.sleep(interval)
+
+
+async def capture(changes, texts, echo):
+    """Read the clipboard after each change and pass on texts that differ from the previous one."""
+    last = None
+    while True:
+        await changes.get()
+        # Collapse a burst of notifications into one read.
+        while not changes.empty():
+            changes.get_nowait()
+        text = await read_clipboard()
+        if not text:
+            continue
+        digest = text_digest(text)
+        if digest == last:
+            continue
+        last = digest
+        if echo:
+            print(text.rstrip("\n"), flush=True)
+        if texts is not None:
+            texts.put_nowait(text)
+
+
+class TranslationCache:
+    """Translations in memory and on disk, keyed by the command and the text."""
+
+    def __init__(self, command, cache_dir=None):
+        self.command = command
+        self.cache_dir = cache_dir
+        self.memory = {}
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".txt")
+
+    def key(self, text):
+        return text_digest("\0".join(self.command) + "\0" + text)
+
+    def get(self, text):
+        key = self.key(text)
+        if key in self.memory:
+            return self.memory[key]
+        if self.cache_dir and os.path.exists(self.path(key)):
+            with open(self.path(key), encoding="utf-8") as f:
+                self.memory[key] = f.read()
+            return self.memory[key]
+        return None
+
+    def put(self, text, translation):
+        key = self.key(text)
+        self.memory[key] = translation
+        if self.cache_dir:
+            path = self.path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(translation)
+            os.replace(tmp, path)
+
+
+async def run_translation(command, text):
+    """Run the translation command with `text` on stdin and return its stdout."""
+    proc = await asyncio.create_subprocess_exec(
+        *command, stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE)
+    out, _ = await proc.communicate(text.encode())
+    if proc.returncode != 0:
+        raise RuntimeError(f"{command[0]} exited with {proc.returncode}: {out.decode(errors='replace').strip()}")
+    return out.decode(errors="replace").rstrip("\n")
+
+
+async def translate(texts, cache, debounce):
+    """Translate queued texts, skipping those superseded within `debounce` seconds."""
+    while True:
+        text = await texts.get()
+        while True:
+            try:
+                text = await asyncio.wait_for(texts.get(), debounce)
+            except asyncio.TimeoutError:
+                break
+        translation = cache.get(text)
+        if translation is None:
+            try:
+                translation = await run_translation(cache.command, text)
+            except Exception as e:
+                print(f"Error: translation failed: {e}", file=sys.stderr)
+                continue
+            cache.put(text, translation)
+        print(translation + "\n", flush=True)
+
+
+async def watch(args):
+    loop = asyncio.get_running_loop()
+    changes = asyncio.Queue()
+    texts = asyncio.Queue() if args.translate else None
+    tasks = []
+
+    if args.poll or not watch_xfixes(loop, changes):
+        if not args.poll:
+            print(f"XFixes events unavailable (python-xlib missing or no X display), polling every {args.interval}s",
+                  file=sys.stderr)
+        tasks.append(asyncio.create_task(poll(changes, args.interval)))
+    else:
+        # Pick up the text already on the clipboard.
+        changes.put_nowait(None)
+
+    tasks.append(asyncio.create_task(capture(changes, texts, args.echo or not args.translate)))
+    if args.translate:
+        cache = TranslationCache(shlex.split(args.translate), args.cache_dir if args.cache else None)
+        tasks.append(asyncio.create_task(translate(texts, cache, args.debounce)))
+    await asyncio.gather(*tasks)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Print new clipboard texts as they are copied, optionally translating them. "
+                    "Uses X clipboard owner-change events (python-xlib) and falls back to polling.")
+    parser.add_argument("-t", "--translate", metavar="CMD",
+                        help="Command that reads a text on stdin and prints its translation, "
+                             "e.g. \"./deepl EN DE\"; prints translations instead of the copied texts")
+    parser.add_argument("-e", "--echo", action="store_true", help="With --translate, also print the copied texts")
+    parser.add_argument("-d", "--debounce", type=float, default=0.5,
+                        help="Seconds without a new copy before translating the latest one (default: 0.5)")
+    parser.add_argument("-p", "--poll", action="store_true", help="Poll the clipboard instead of waiting for X events")
+    parser.add_argument("-i", "--interval", type=float, default=0.5, help="Polling interval in seconds (default: 0.5)")
+    parser.add_argument("--no-cache", action="store_false", dest="cache", help="Don't reuse or store translations on disk")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help=f"Translation cache (default: {CACHE_DIR})")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(watch(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
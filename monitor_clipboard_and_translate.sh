@@ -1,13 +1,7 @@
 #!/bin/bash
 
-prev=""
-while [ 1 ]; do
-curr="$(xclip -selection clipboard -o)"
-if [[ "$curr" != "$prev" ]]; then
-    #if [[ !  "$curr" =~ ^http ]]; then
-	echo "$curr"
-    #fi
-fi
-prev="$curr"
-sleep 0.2
-done
+# Runs monitor_clipboard_and_translate.py, which waits for clipboard change
+# events instead of running xclip every 0.2s, and can translate what is
+# copied (see its --help).
+
+exec python3 "$(dirname "$(readlink -f "$0")")/monitor_clipboard_and_translate.py" "$@"
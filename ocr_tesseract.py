@@ -21,9 +21,19 @@
 
 import sys
 import argparse
+import glob
+import hashlib
+import itertools
 import json
 import os
+import queue
+import shlex
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+import numpy as np
 from PIL import Image
+from script_cache import cache_dir
 import subprocess  # Added to handle the --view parameter
 
 # Try to import required libraries with helpful error messages if they fail
@@ -47,67 +57,907 @@ except ImportError:
     print("# pip install pytesseract")
     sys.exit(1)
 
-def preprocess_image(image, grayscale=True, threshold=False, threshold_value=150, adaptive=False):
-    """Preprocess the image with specified options."""
-    processed = image.copy()
-    if grayscale:
+def parse_tesseract_config(tesseract_config):
+    """Split a tesseract command line config into psm, oem, lang and -c variables."""
+    options = {"psm": 3, "oem": 3, "lang": "eng", "variables": {}}
+    tokens = shlex.split(tesseract_config)
+    for flag, value in zip(tokens, tokens[1:]):
+        if flag == "--psm":
+            options["psm"] = int(value)
+        elif flag == "--oem":
+            options["oem"] = int(value)
+        elif flag == "-l":
+            options["lang"] = value
+        elif flag == "-c" and "=" in value:
+            key, val = value.split("=", 1)
+            options["variables"][key] = val
+    return options
+
+def tsv_to_dict(tsv):
+    """Parse Tesseract TSV rows (with header) into pytesseract's Output.DICT layout."""
+    rows = [row.split("\t") for row in tsv.strip("\n").split("\n")]
+    header = rows.pop(0)
+    result = {head: [] for head in header}
+    for row in rows:
+        if len(row) < len(header):
+            # The last cell is missing when a word's text is empty.
+            row.append("")
+        for head, value in zip(header[:-1], row):
+            result[head].append(int(float(value)))
+        result[header[-1]].append(row[len(header) - 1])
+    return result
+
+TSV_HEADER = "level\tpage_num\tblock_num\tpar_num\tline_num\tword_num\tleft\ttop\twidth\theight\tconf\ttext\n"
+
+class PytesseractEngine:
+    """Runs the tesseract binary for every call via pytesseract (always available fallback)."""
+    name = "pytesseract"
+
+    def __init__(self, tesseract_config):
+        self.tesseract_config = tesseract_config
+
+    def image_to_string(self, image):
+        return pytesseract.image_to_string(Image.fromarray(image), config=self.tesseract_config)
+
+    def image_to_data(self, image):
+        return pytesseract.image_to_data(Image.fromarray(image), config=self.tesseract_config,
+                                         output_type=pytesseract.Output.DICT)
+
+class TesserocrEngine:
+    """Keeps a warm in-process libtesseract handle (via tesserocr).
+
+    Language data is loaded once per process and images are handed over as
+    raw pixel buffers, so there is no temp PNG, fork or traineddata reload
+    per page.
+    """
+    name = "tesserocr"
+
+    def __init__(self, tesseract_config):
+        import tesserocr
+        options = parse_tesseract_config(tesseract_config)
+        self.api = tesserocr.PyTessBaseAPI(lang=options["lang"], psm=options["psm"], oem=options["oem"])
+        for key, value in options["variables"].items():
+            self.api.SetVariable(key, value)
+        self.page_separator = options["variables"].get("page_separator", "\f")
+        self._pixels = None
+
+    def set_image(self, image):
+        # tesserocr does not copy the buffer, so keep it alive until the next image.
+        self._pixels = image.tobytes()
+        height, width = image.shape[:2]
+        bytes_per_pixel = 1 if image.ndim == 2 else image.shape[2]
+        self.api.SetImageBytes(self._pixels, width, height, bytes_per_pixel, width * bytes_per_pixel)
+
+    def image_to_string(self, image):
+        self.set_image(image)
+        # Same page separator the tesseract binary appends to its txt output.
+        return self.api.GetUTF8Text() + self.page_separator
+
+    def image_to_data(self, image):
+        self.set_image(image)
+        self.api.Recognize()
+        return tsv_to_dict(TSV_HEADER + self.api.GetTSVText(0))
+
+ENGINES = {engine.name: engine for engine in (PytesseractEngine, TesserocrEngine)}
+
+# One engine per (name, config) per process, so worker processes stay warm.
+_engine_cache = {}
+
+def create_engine(name, tesseract_config):
+    """Build a new engine; 'auto' prefers tesserocr and falls back to pytesseract."""
+    if name == "auto":
+        try:
+            return TesserocrEngine(tesseract_config)
+        except (ImportError, RuntimeError):
+            return PytesseractEngine(tesseract_config)
+    return ENGINES[name](tesseract_config)
+
+def get_engine(name, tesseract_config):
+    """Return this process's engine for name and config, creating it on first use."""
+    key = (name, tesseract_config)
+    if key not in _engine_cache:
+        _engine_cache[key] = create_engine(name, tesseract_config)
+    return _engine_cache[key]
+
+def preprocess_image(image, grayscale=True, threshold=False, threshold_value=150, adaptive=False, in_place=False):
+    """Preprocess the image with specified options.
+
+    No full-frame copy is made: thresholding writes into the grayscale
+    buffer created by the conversion. A single-channel input is only
+    overwritten with `in_place`; otherwise the threshold gets a new buffer
+    and the input is returned untouched when there is nothing to do.
+    """
+    processed = image
+    if grayscale and processed.ndim == 3:
         processed = cv2.cvtColor(processed, cv2.COLOR_BGR2GRAY)
     if threshold:
+        dst = processed if in_place or processed is not image else None
         if adaptive:
-            processed = cv2.adaptiveThreshold(processed, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2)
+            processed = cv2.adaptiveThreshold(processed, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2, dst=dst)
         else:
-            _, processed = cv2.threshold(processed, threshold_value, 255, cv2.THRESH_BINARY)
+            _, processed = cv2.threshold(processed, threshold_value, 255, cv2.THRESH_BINARY, dst=dst)
     return processed
 
-def draw_bounding_boxes(image, data, output_path):
+# One row per recognised word; the numeric columns of image_to_data() plus the text.
+BOX_DTYPE = np.dtype([
+    ("block_num", np.int32), ("par_num", np.int32), ("line_num", np.int32), ("word_num", np.int32),
+    ("left", np.int32), ("top", np.int32), ("width", np.int32), ("height", np.int32),
+    ("conf", np.int32), ("text", object),
+])
+
+def word_boxes(data):
+    """Convert image_to_data() output into a BOX_DTYPE array of the non-empty words."""
+    text = np.array(data["text"], dtype=object)
+    mask = np.char.str_len(np.char.strip(text.astype(str))) > 0 if len(text) else np.zeros(0, dtype=bool)
+    boxes = np.empty(int(mask.sum()), dtype=BOX_DTYPE)
+    for name in BOX_DTYPE.names:
+        boxes[name] = text[mask] if name == "text" else np.asarray(data[name])[mask]
+    return boxes
+
+def result_boxes(result):
+    """The word boxes of an OCR result, converted once and kept on the result."""
+    if "boxes" not in result:
+        result["boxes"] = word_boxes(result["data"])
+    return result["boxes"]
+
+def draw_bounding_boxes(image, data, output_path, boxes=None):
     """Draw bounding boxes on the image and save it."""
-    try:
-        import numpy as np
-        # Make a copy of the image to draw on
-        img_with_boxes = image.copy()
-        
-        # Draw rectangles for each detected text area
-        for i in range(len(data["text"])):
-            if data["text"][i].strip():
-                x, y, w, h = data["left"][i], data["top"][i], data["width"][i], data["height"][i]
-                cv2.rectangle(img_with_boxes, (x, y), (x + w, y + h), (0, 255, 0), 2)
-                
-                # Add text label with confidence
-                text = f"{data['text'][i]} ({data['conf'][i]}%)"
-                cv2.putText(img_with_boxes, text, (x, y - 10), 
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 1)
-        
-        # Save the image with bounding boxes
-        cv2.imwrite(output_path, img_with_boxes)
-        return True
-    except ImportError as e:
-        print(f"ERROR: Cannot generate image with bounding boxes due to missing import: {e}", file=sys.stderr)
-        return False
+    if boxes is None:
+        boxes = word_boxes(data)
+    # Grayscale pages (the default preprocessing) get colour channels, or
+    # the coloured boxes and labels would all come out black.
+    img_with_boxes = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR) if image.ndim == 2 else image.copy()
 
-def perform_ocr(image_path, preprocess_options, tesseract_config, return_bounding_boxes=False, draw_boxes_path=None):
-    """Run OCR on the image with the given settings."""
-    image = cv2.imread(image_path)
-    if image is None:
-        raise ValueError(f"Unable to load image at {image_path}")
+    # All rectangles in one call, as closed 4-point polygons
+    x0, y0 = boxes["left"], boxes["top"]
+    x1, y1 = x0 + boxes["width"], y0 + boxes["height"]
+    corners = np.stack([np.stack(corner, axis=-1) for corner in ((x0, y0), (x1, y0), (x1, y1), (x0, y1))], axis=1)
+    cv2.polylines(img_with_boxes, list(corners.astype(np.int32)), True, (0, 255, 0), 2)
+
+    # Add text label with confidence
+    for text, conf, x, y in zip(boxes["text"], boxes["conf"].tolist(), x0.tolist(), (y0 - 10).tolist()):
+        cv2.putText(img_with_boxes, f"{text} ({conf}%)", (x, y),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 1)
+
+    # Save the image with bounding boxes
+    cv2.imwrite(output_path, img_with_boxes)
+    return True
+
+def text_from_data(data):
+    """Rebuild Tesseract's plain-text output from image_to_data() results.
+
+    Mirrors the txt renderer: words of a line joined by single spaces, a
+    newline after each line, a blank line between paragraphs and a form
+    feed after each page.
+    """
+    parts = []
+    words = []
+    line_key = par_key = None
+
+    def end_line():
+        if words:
+            parts.append(" ".join(words) + "\n")
+            words.clear()
+
+    for i, level in enumerate(data["level"]):
+        if level == 1:
+            # A new page: close the previous one.
+            if i > 0:
+                end_line()
+                parts.append("\f")
+            line_key = par_key = None
+        elif level == 5:
+            key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+            if key != line_key:
+                end_line()
+                if par_key is not None and key[:2] != par_key:
+                    parts.append("\n")
+            line_key, par_key = key, key[:2]
+            words.append(data["text"][i])
+    if data["level"]:
+        end_line()
+        parts.append("\f")
+    return "".join(parts)
+
+def single_pass_supported(tesseract_config):
+    """Whether text_from_data() reproduces image_to_string() for this config."""
+    # These change the txt renderer's spacing/separators in ways the TSV data does not record.
+    return "preserve_interword_spaces" not in tesseract_config and "page_separator" not in tesseract_config
+
+OCR_CACHE_DIR = cache_dir("ocr")
+
+def file_digest(path):
+    """sha256 of a file's bytes, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class OcrCache:
+    """Content-addressed on-disk cache of OCR results.
+
+    Entries are keyed by the sha256 of the input bytes plus every setting
+    that changes the output, so renamed or moved files still hit and any
+    changed flag misses. Hits refresh the entry's mtime and prune() drops
+    the least recently used entries beyond `max_bytes`. Instances are
+    picklable, so batch workers share the same directory.
+    """
+
+    def __init__(self, directory=OCR_CACHE_DIR, max_bytes=512 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, digest, **settings):
+        return hashlib.sha256((digest + json.dumps(settings, sort_keys=True)).encode()).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".json")
+
+    def get(self, key, need_data=False):
+        """The cached result for key, or None. Entries stored without box data miss when `need_data`."""
+        path = self.path(key)
+        try:
+            with open(path) as f:
+                result = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if need_data and "data" not in result:
+            return None
+        os.utime(path)
+        result["cached"] = True
+        return result
+
+    def put(self, key, result):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        entry = {name: result[name] for name in ("text", "data") if name in result}
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp, path)
+
+    def prune(self):
+        """Evict least recently used entries until the cache fits; returns (files removed, bytes kept)."""
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed, total
+
+def perform_ocr(image_path, preprocess_options, tesseract_config, return_bounding_boxes=False, draw_boxes_path=None, single_pass=True, engine="auto", cache=None):
+    """Run OCR on the image with the given settings, reusing a cached result when `cache` has one."""
+    if cache is not None:
+        key = cache.key(file_digest(image_path), tesseract_config=tesseract_config,
+                        preprocess_options=preprocess_options, engine=engine)
+        result = cache.get(key, return_bounding_boxes or draw_boxes_path)
+        if result is not None:
+            if draw_boxes_path:
+                draw_bounding_boxes(load_image(image_path), result["data"], draw_boxes_path, result_boxes(result))
+            return result
+    image = load_image(image_path)
+    result = ocr_image(image, preprocess_options, tesseract_config, return_bounding_boxes, draw_boxes_path, single_pass, engine)
+    if cache is not None:
+        cache.put(key, result)
+    return result
+
+def ocr_image(image, preprocess_options, tesseract_config, return_bounding_boxes=False, draw_boxes_path=None, single_pass=True, engine="auto"):
+    """Run OCR on an already loaded image (BGR or grayscale array)."""
     processed_image = preprocess_image(image, **preprocess_options)
-    pil_image = Image.fromarray(processed_image)
-    extracted_text = pytesseract.image_to_string(pil_image, config=tesseract_config)
-    output = {"text": extracted_text}
-    
+    ocr_engine = get_engine(engine, tesseract_config)
+
     # Always get bounding box data if we need to draw boxes
     if return_bounding_boxes or draw_boxes_path:
-        data = pytesseract.image_to_data(pil_image, config=tesseract_config, output_type=pytesseract.Output.DICT)
-        output["data"] = data
-        
+        data = ocr_engine.image_to_data(processed_image)
+        # One recognition pass: the text is rebuilt from the box data.
+        if single_pass and single_pass_supported(tesseract_config):
+            extracted_text = text_from_data(data)
+        else:
+            extracted_text = ocr_engine.image_to_string(processed_image)
+        output = {"text": extracted_text, "data": data}
+
         # Draw bounding boxes if requested
         if draw_boxes_path:
-            draw_bounding_boxes(image, data, draw_boxes_path)
-    
+            output["boxes"] = word_boxes(data)
+            draw_bounding_boxes(image, data, draw_boxes_path, output["boxes"])
+    else:
+        output = {"text": ocr_engine.image_to_string(processed_image)}
+
     return output
 
+def tile_spans(length, tile, overlap):
+    """(start, size) of tiles covering [0, length) with at least `overlap` pixels shared.
+
+    A remainder that would need a tile shifted by less than `overlap` from
+    the previous one is absorbed by enlarging that tile instead, so no
+    near-duplicate tile is OCRed.
+    """
+    if length <= tile:
+        return [(0, length)]
+    step = tile - overlap
+    starts = list(range(0, length - tile, step))
+    if length - tile - starts[-1] < overlap:
+        return [(start, tile) for start in starts[:-1]] + [(starts[-1], length - starts[-1])]
+    return [(start, tile) for start in starts] + [(length - tile, tile)]
+
+def overlap_bands(spans):
+    """[start, end) ranges covered by two neighbouring tiles."""
+    return [(start, prev_start + prev_size) for (prev_start, prev_size), (start, _) in zip(spans, spans[1:])]
+
+def in_bands(start, end, bands):
+    """Mask of the [start, end) intervals that intersect any of the bands."""
+    mask = np.zeros(len(start), dtype=bool)
+    for band_start, band_end in bands:
+        mask |= (start < band_end) & (end > band_start)
+    return mask
+
+def dedupe_boxes(left, top, width, height, conf, min_overlap=0.5, cell=256):
+    """Indices of boxes to keep, dropping any box that mostly lies inside a more confident kept one.
+
+    Overlap is measured relative to the smaller box, so both a word read
+    twice in a tile overlap and a fragment of a word cut at a tile edge are
+    removed. Kept boxes are bucketed in a grid of `cell`-pixel squares, so
+    each box is only compared with kept boxes near it.
+    """
+    right, bottom = (left + width).tolist(), (top + height).tolist()
+    area = np.maximum(width * height, 1)
+    left, top, area = left.tolist(), top.tolist(), area.tolist()
+    grid = {}
+    keep = []
+    for i in np.lexsort((-np.asarray(area), -conf)).tolist():
+        cells = [(cx, cy) for cx in range(left[i] // cell, max(right[i] - 1, left[i]) // cell + 1)
+                 for cy in range(top[i] // cell, max(bottom[i] - 1, top[i]) // cell + 1)]
+        duplicate = False
+        for k in {k for c in cells for k in grid.get(c, ())}:
+            iw = min(right[k], right[i]) - max(left[k], left[i])
+            ih = min(bottom[k], bottom[i]) - max(top[k], top[i])
+            if iw > 0 and ih > 0 and iw * ih >= min_overlap * min(area[k], area[i]):
+                duplicate = True
+                break
+        if duplicate:
+            continue
+        keep.append(i)
+        for c in cells:
+            grid.setdefault(c, []).append(i)
+    return np.array(keep, dtype=int)
+
+def group_lines(left, top, height):
+    """Assign line numbers to word boxes by vertical overlap, in reading order."""
+    order = np.lexsort((left, top + height / 2))
+    line_num = np.zeros(len(left), dtype=int)
+    line, line_bottom = 0, -1
+    for i in order:
+        center = top[i] + height[i] / 2
+        if center > line_bottom:
+            line += 1
+            line_bottom = top[i] + height[i]
+        line_num[i] = line
+    return line_num
+
+def ocr_tiled(image, preprocess_options, tesseract_config, tile=2048, overlap=200, workers=None,
+              return_bounding_boxes=False, draw_boxes_path=None, engine="auto"):
+    """OCR a very large image as overlapping tiles on a thread pool.
+
+    The preprocessed frame is built once and tiles are views into it, so
+    memory stays at about one grayscale copy of the image. Tile results are
+    shifted into page coordinates, words read twice in an overlap are
+    de-duplicated, and the text is rebuilt line by line from the merged
+    boxes. `overlap` should exceed the tallest/widest word on the page.
+    """
+    processed = preprocess_image(image, in_place=draw_boxes_path is None, **preprocess_options)
+    height, width = processed.shape[:2]
+    x_spans, y_spans = tile_spans(width, tile, overlap), tile_spans(height, tile, overlap)
+    tiles = [(x, y, w, h) for y, h in y_spans for x, w in x_spans]
+    workers = min(workers or os.cpu_count(), len(tiles))
+
+    # A tesserocr handle serves one thread at a time, and it has to be created
+    # on the main thread, so build one engine per worker up front and lend them out.
+    engines = queue.SimpleQueue()
+    for _ in range(workers):
+        engines.put(create_engine(engine, tesseract_config))
+
+    def ocr_tile(span):
+        x, y, w, h = span
+        ocr_engine = engines.get()
+        try:
+            return x, y, w, h, ocr_engine.image_to_data(processed[y:y + h, x:x + w])
+        finally:
+            engines.put(ocr_engine)
+
+    columns = {key: [] for key in ("left", "top", "width", "height", "conf")}
+    words, confs = [], []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for x, y, w, h, data in executor.map(ocr_tile, tiles):
+            # Edges shared with a neighbouring tile; a word touching one may be cut
+            # off, and the overlap guarantees a complete copy in the neighbour.
+            min_x, min_y = (1 if x > 0 else -1), (1 if y > 0 else -1)
+            max_x = w - 1 if x + w < width else w + 1
+            max_y = h - 1 if y + h < height else h + 1
+            for i, text in enumerate(data["text"]):
+                if data["level"][i] == 5 and text.strip():
+                    left, top = data["left"][i], data["top"][i]
+                    if (left < min_x or top < min_y or left + data["width"][i] > max_x
+                            or top + data["height"][i] > max_y):
+                        continue
+                    words.append(text)
+                    confs.append(data["conf"][i])
+                    columns["left"].append(left + x)
+                    columns["top"].append(top + y)
+                    columns["width"].append(data["width"][i])
+                    columns["height"].append(data["height"][i])
+                    columns["conf"].append(data["conf"][i])
+    columns = {key: np.array(values, dtype=float if key == "conf" else int) for key, values in columns.items()}
+
+    # Only boxes in an overlap band can have been read twice; the rest are kept as they are.
+    shared = (in_bands(columns["left"], columns["left"] + columns["width"], overlap_bands(x_spans))
+              | in_bands(columns["top"], columns["top"] + columns["height"], overlap_bands(y_spans)))
+    candidates = np.flatnonzero(shared)
+    deduped = candidates[dedupe_boxes(*(columns[key][candidates] for key in ("left", "top", "width", "height", "conf")))]
+    keep = np.sort(np.concatenate([np.flatnonzero(~shared), deduped]))
+    columns = {key: values[keep] for key, values in columns.items()}
+    words = [words[i] for i in keep]
+    confs = [confs[i] for i in keep]
+    line_num = group_lines(columns["left"], columns["top"], columns["height"])
+    order = np.lexsort((columns["left"], line_num))
+
+    data = {key: [] for key in TSV_HEADER.split()}
+    lines = {}
+    for i in order:
+        line = int(line_num[i])
+        lines.setdefault(line, []).append(words[i])
+        data["level"].append(5)
+        data["page_num"].append(1)
+        data["block_num"].append(1)
+        data["par_num"].append(1)
+        data["line_num"].append(line)
+        data["word_num"].append(len(lines[line]))
+        for key in ("left", "top", "width", "height"):
+            data[key].append(int(columns[key][i]))
+        data["conf"].append(confs[i])
+        data["text"].append(words[i])
+    text = "".join(" ".join(line) + "\n" for line in lines.values()) + "\f"
+
+    if draw_boxes_path:
+        draw_bounding_boxes(image, data, draw_boxes_path)
+    if return_bounding_boxes or draw_boxes_path:
+        return {"text": text, "data": data}
+    return {"text": text}
+
+def benchmark_single_pass(image_paths, preprocess_options, tesseract_config, engine="auto"):
+    """Time two-pass (string + data) against single-pass OCR and check the text matches."""
+    totals = {"two-pass": 0.0, "single-pass": 0.0}
+    mismatches = 0
+    for image_path in image_paths:
+        results = {}
+        for mode, single_pass in (("two-pass", False), ("single-pass", True)):
+            start = time.perf_counter()
+            results[mode] = perform_ocr(image_path, preprocess_options, tesseract_config, True, None, single_pass, engine)
+            totals[mode] += time.perf_counter() - start
+        if results["two-pass"]["text"] != results["single-pass"]["text"]:
+            mismatches += 1
+            print(f"MISMATCH: {image_path}", file=sys.stderr)
+    n = len(image_paths)
+    print(f"Images: {n}, text mismatches: {mismatches}", file=sys.stderr)
+    for mode, total in totals.items():
+        print(f"{mode:12} {total:8.2f}s total {total / n:8.3f}s/image", file=sys.stderr)
+    if totals["single-pass"] > 0:
+        print(f"speed-up     {totals['two-pass'] / totals['single-pass']:8.2f}x", file=sys.stderr)
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".tif", ".tiff", ".bmp", ".webp", ".pbm", ".pgm", ".ppm"}
+
+def is_batch_input(entries, file_list):
+    """Whether the inputs name more than a single image file."""
+    if file_list or len(entries) != 1:
+        return True
+    return os.path.isdir(entries[0]) or glob.has_magic(entries[0])
+
+def expand_image_paths(entries, file_list=None):
+    """Yield image paths from files, directories, glob patterns and an optional file list ('-' for stdin)."""
+    if file_list:
+        f = sys.stdin if file_list == "-" else open(file_list)
+        with f:
+            entries = itertools.chain(entries, (line.strip() for line in f if line.strip()))
+            yield from expand_image_paths(entries)
+        return
+    for entry in entries:
+        if os.path.isdir(entry):
+            for name in sorted(os.listdir(entry)):
+                if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                    yield os.path.join(entry, name)
+        elif glob.has_magic(entry):
+            yield from sorted(glob.glob(entry))
+        else:
+            yield entry
+
+def bounding_box_image_path(image_path, draw_bounding_boxes):
+    """Output path for --draw-bounding-boxes, always with a .png extension."""
+    if not draw_bounding_boxes:
+        return None
+    # Handle special cases for auto-naming
+    if draw_bounding_boxes == '-' or draw_bounding_boxes.lower() == 'auto':
+        # Generate filename based on input image name
+        base_name = os.path.splitext(image_path)[0]
+        return f"{base_name}.bb.png"
+    draw_boxes_path = draw_bounding_boxes
+    if not draw_boxes_path.lower().endswith('.png'):
+        draw_boxes_path += '.png'
+    return draw_boxes_path
+
+def jsonl_records(result, bounding_boxes, source=None, page=None):
+    """Yield the --jsonl records for one OCR result, tagged with `source` (and PDF `page`) in batch mode."""
+    tag = {} if source is None else {"source": source}
+    if page is not None:
+        tag["page"] = page
+    # Full text first
+    yield {"type": "full_text", "text": result["text"], **tag}
+
+    # Then each text box if bounding boxes requested
+    if bounding_boxes:
+        boxes = result_boxes(result)
+        columns = [boxes[name].tolist() for name in ("text", "left", "top", "width", "height", "conf")]
+        for text, x, y, w, h, conf in zip(*columns):
+            yield {"type": "text_box", "text": text, "x": x, "y": y, "w": w, "h": h, "confidence": conf, **tag}
+
+def print_result(result, args, source=None, page=None):
+    if args.jsonl:
+        for record in jsonl_records(result, args.bounding_boxes, source, page):
+            print(json.dumps(record), flush=source is not None)
+    else:
+        if page is not None:
+            print(f"==> {source} page {page} <==")
+        elif source is not None:
+            print(f"==> {source} <==")
+        # Original human-readable output format
+        print("Extracted Text:", result["text"])
+        if args.bounding_boxes and "data" in result:
+            print("\nBounding Box Data:")
+            for box in result_boxes(result).tolist():
+                text, x, y, w, h, conf = box[-1], *box[4:9]
+                print(f"Text: '{text}' | Box: [{x}, {y}, {w}, {h}] | Confidence: {conf}")
+
+COLUMNAR_FORMATS = {".csv": "csv", ".parquet": "parquet", ".arrow": "arrow", ".feather": "arrow", ".npy": "npy"}
+
+class ColumnarWriter:
+    """Writes word boxes of every OCR result to one columnar file for analytics.
+
+    The format follows the extension: .csv, .parquet, .arrow/.feather (Arrow
+    IPC) or .npy (a structured array). Rows carry the source file and page
+    next to the BOX_DTYPE columns. CSV and Arrow formats are written one
+    result at a time; .npy is assembled at close().
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.format = COLUMNAR_FORMATS.get(os.path.splitext(path)[1].lower())
+        if self.format is None:
+            raise ValueError(f"unknown columnar format for {path}; use one of {', '.join(COLUMNAR_FORMATS)}")
+        self._chunks = []
+        self._writer = None
+        self._file = None
+        if self.format in ("parquet", "arrow"):
+            try:
+                import pyarrow
+            except ImportError:
+                raise ValueError(f"writing {path} needs pyarrow (pip install pyarrow)")
+            self._pa = pyarrow
+            # One explicit schema, so results without words (null-typed columns
+            # if inferred) still match the file's schema.
+            self._schema = pyarrow.schema(
+                [("source", pyarrow.string()), ("page", pyarrow.int32())]
+                + [(name, pyarrow.string() if name == "text" else pyarrow.int32()) for name in BOX_DTYPE.names])
+        elif self.format == "csv":
+            import csv
+            self._file = open(path, "w", newline="")
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(["source", "page"] + list(BOX_DTYPE.names))
+
+    def write(self, boxes, source=None, page=None):
+        source = "" if source is None else source
+        page = 0 if page is None else page
+        if self.format == "csv":
+            self._writer.writerows([source, page, *row] for row in boxes.tolist())
+        elif self.format == "npy":
+            self._chunks.append((source, page, boxes))
+        else:
+            columns = {"source": [source] * len(boxes), "page": np.full(len(boxes), page, dtype=np.int32)}
+            columns.update((name, boxes[name].tolist() if name == "text" else boxes[name]) for name in BOX_DTYPE.names)
+            table = self._pa.table(columns, schema=self._schema)
+            if self._writer is None:
+                if self.format == "parquet":
+                    import pyarrow.parquet
+                    self._writer = pyarrow.parquet.ParquetWriter(self.path, self._schema)
+                else:
+                    self._writer = self._pa.ipc.new_file(self.path, self._schema)
+            self._writer.write_table(table)
+
+    def close(self):
+        if self.format == "csv":
+            self._file.close()
+        elif self.format == "npy":
+            texts = [text for _, _, boxes in self._chunks for text in boxes["text"]]
+            sources = [source for source, _, _ in self._chunks]
+            dtype = np.dtype([("source", f"U{max(map(len, sources), default=1) or 1}"), ("page", np.int32)]
+                             + [(name, BOX_DTYPE[name]) for name in BOX_DTYPE.names if name != "text"]
+                             + [("text", f"U{max(map(len, texts), default=1) or 1}")])
+            table = np.empty(len(texts), dtype=dtype)
+            start = 0
+            for source, page, boxes in self._chunks:
+                rows = table[start:start + len(boxes)]
+                rows["source"], rows["page"] = source, page
+                for name in BOX_DTYPE.names:
+                    rows[name] = boxes[name]
+                start += len(boxes)
+            np.save(self.path, table)
+        else:
+            if self._writer is None:
+                # No results at all: still leave an empty file with the schema.
+                self.write(np.empty(0, dtype=BOX_DTYPE))
+            self._writer.close()
+
+def init_ocr_worker():
+    """Keep every worker single-threaded; the process pool provides the parallelism."""
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+    cv2.setNumThreads(1)
+
+def ocr_batch(image_paths, workers, preprocess_options, tesseract_config, return_bounding_boxes, draw_bounding_boxes, engine="auto", cache=None):
+    """OCR many images on a process pool, yielding (image_path, result, error) in completion order.
+
+    At most a few tasks per worker are queued at a time, so a file list of
+    tens of thousands of paths is consumed lazily.
+    """
+    image_paths = iter(image_paths)
+    pending = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_ocr_worker) as executor:
+        def submit(image_path):
+            future = executor.submit(perform_ocr, image_path, preprocess_options, tesseract_config,
+                                     return_bounding_boxes, bounding_box_image_path(image_path, draw_bounding_boxes),
+                                     True, engine, cache)
+            pending[future] = image_path
+
+        for image_path in itertools.islice(image_paths, workers * 4):
+            submit(image_path)
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                image_path = pending.pop(future)
+                try:
+                    yield image_path, future.result(), None
+                except Exception as e:
+                    yield image_path, None, e
+                for image_path in itertools.islice(image_paths, 1):
+                    submit(image_path)
+
+def parse_page_ranges(spec, page_count):
+    """Turn '1-3,7,10-' into a sorted list of 1-based page numbers within page_count."""
+    if not spec:
+        return list(range(1, page_count + 1))
+    pages = set()
+    for part in spec.split(","):
+        part = part.strip()
+        if "-" in part:
+            first, last = part.split("-", 1)
+            first = int(first) if first else 1
+            last = int(last) if last else page_count
+        else:
+            first = last = int(part)
+        pages.update(range(max(first, 1), min(last, page_count) + 1))
+    return sorted(pages)
+
+def iter_pdf_pages(pdf_path, dpi=300, pages=None, grayscale=True, want=None):
+    """Yield (page_number, image, error) for the selected pages, rasterising one page at a time.
+
+    Uses pypdfium2 or PyMuPDF when installed and falls back to poppler's
+    pdftoppm. Images are BGR (or single-channel when `grayscale`) arrays,
+    ready for preprocess_image(). Pages for which `want(page_number)` is
+    false are yielded as (page_number, None, None) without rendering them.
+    A page that fails to render is yielded as (page_number, None, error)
+    and the remaining pages are still rendered.
+    """
+    def selected(page_count, render):
+        for page_number in parse_page_ranges(pages, page_count):
+            if want is not None and not want(page_number):
+                yield page_number, None, None
+                continue
+            try:
+                image = render(page_number)
+            except Exception as e:
+                yield page_number, None, e
+                continue
+            yield page_number, image, None
+
+    try:
+        import pypdfium2 as pdfium
+        pdf = pdfium.PdfDocument(pdf_path)
+
+        def render(page_number):
+            page = pdf[page_number - 1]
+            bitmap = page.render(scale=dpi / 72, grayscale=grayscale)
+            image = bitmap.to_numpy().copy()
+            bitmap.close()
+            page.close()
+            if image.ndim == 3:
+                image = image[:, :, 0] if grayscale else image[:, :, :3]
+            return image
+
+        try:
+            yield from selected(len(pdf), render)
+        finally:
+            pdf.close()
+        return
+    except ImportError:
+        pass
+
+    try:
+        import fitz
+        with fitz.open(pdf_path) as doc:
+            def render(page_number):
+                pix = doc[page_number - 1].get_pixmap(dpi=dpi, colorspace=fitz.csGRAY if grayscale else fitz.csRGB)
+                image = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+                return image[:, :, 0].copy() if grayscale else cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+
+            yield from selected(doc.page_count, render)
+        return
+    except ImportError:
+        pass
+
+    def render(page_number):
+        command = ["pdftoppm", "-r", str(dpi), "-f", str(page_number), "-l", str(page_number)]
+        if grayscale:
+            command.append("-gray")
+        ppm = subprocess.run(command + [pdf_path], capture_output=True, check=True).stdout
+        image = cv2.imdecode(np.frombuffer(ppm, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+        if image is None:
+            raise ValueError("pdftoppm produced no image")
+        return image
+
+    info = subprocess.run(["pdfinfo", pdf_path], capture_output=True, text=True, check=True).stdout
+    page_count = int(next(line.split()[1] for line in info.splitlines() if line.startswith("Pages:")))
+    yield from selected(page_count, render)
+
+def ocr_pdf(pdf_path, workers, dpi, pages, preprocess_options, tesseract_config, return_bounding_boxes, draw_bounding_boxes, engine="auto", cache=None):
+    """OCR a PDF page by page on a process pool, yielding (page_number, result, error) in page order.
+
+    Pages are rasterised lazily and at most two per worker are in flight,
+    so memory stays bounded however long the document is. With a `cache`,
+    pages already OCRed with the same settings are neither rendered nor
+    OCRed again, unless boxes have to be drawn on them. A page that fails
+    to render or OCR comes back with `error` set instead of a result.
+    """
+    base_name = os.path.splitext(pdf_path)[0]
+    cached = {}
+    keys = {}
+    if cache is not None:
+        digest = file_digest(pdf_path)
+
+        def want(page_number):
+            keys[page_number] = cache.key(digest, page=page_number, dpi=dpi, tesseract_config=tesseract_config,
+                                          preprocess_options=preprocess_options, engine=engine)
+            result = cache.get(keys[page_number], return_bounding_boxes)
+            if result is not None:
+                cached[page_number] = result
+            return result is None or bool(draw_bounding_boxes)
+    else:
+        want = None
+
+    def finished(page_number, future):
+        try:
+            result = future.result()
+        except Exception as e:
+            return page_number, None, e
+        if page_number in keys and not result.get("cached"):
+            cache.put(keys[page_number], result)
+        return page_number, result, None
+
+    in_flight = deque()
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_ocr_worker) as executor:
+        for page_number, image, error in iter_pdf_pages(pdf_path, dpi, pages, preprocess_options["grayscale"], want):
+            draw_boxes_path = f"{base_name}.p{page_number:04d}.bb.png" if draw_bounding_boxes else None
+            if error is not None:
+                future = Future()
+                future.set_exception(error)
+            elif page_number in cached and not draw_boxes_path:
+                future = Future()
+                future.set_result(cached.pop(page_number))
+            else:
+                cached.pop(page_number, None)
+                future = executor.submit(ocr_image, image, preprocess_options, tesseract_config,
+                                         return_bounding_boxes, draw_boxes_path, True, engine)
+            in_flight.append((page_number, future))
+            del image
+            if len(in_flight) >= workers * 2:
+                yield finished(*in_flight.popleft())
+        while in_flight:
+            yield finished(*in_flight.popleft())
+
+PROFILE_CACHE = cache_dir("ocr_profiles.json")
+
+# Candidate preprocessing variants tried by --auto-tune
+TUNING_GRID = [
+    {"grayscale": True, "threshold": False, "threshold_value": 150, "adaptive": False},
+    {"grayscale": True, "threshold": True, "threshold_value": 120, "adaptive": False},
+    {"grayscale": True, "threshold": True, "threshold_value": 150, "adaptive": False},
+    {"grayscale": True, "threshold": True, "threshold_value": 180, "adaptive": False},
+    {"grayscale": True, "threshold": True, "threshold_value": 150, "adaptive": True},
+]
+
+def mean_word_confidence(data):
+    """Mean confidence of recognised words, and how many there were."""
+    confidences = [conf for conf, text in zip(data["conf"], data["text"]) if conf >= 0 and text.strip()]
+    if not confidences:
+        return 0.0, 0
+    return sum(confidences) / len(confidences), len(confidences)
+
+def tune_preprocessing(image, tesseract_config, engine="auto", max_side=1600):
+    """Try TUNING_GRID on a downscaled copy of image; return (best options, score)."""
+    scale = max_side / max(image.shape[:2])
+    if scale < 1:
+        image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    ocr_engine = get_engine(engine, tesseract_config)
+    best, best_score = None, (-1.0, 0)
+    for options in TUNING_GRID:
+        score = mean_word_confidence(ocr_engine.image_to_data(preprocess_image(image, **options)))
+        print(f"auto-tune: {options} -> mean confidence {score[0]:.1f} over {score[1]} words", file=sys.stderr)
+        if score > best_score:
+            best, best_score = options, score
+    return best, best_score[0]
+
+def profile_preprocess_options(profile, load_sample, tesseract_config, engine="auto", retune=False):
+    """Preprocessing options for a document profile, tuned once and cached on disk.
+
+    `load_sample` is only called when the profile has no cached decision
+    for this tesseract_config (or `retune` is set).
+    """
+    try:
+        with open(PROFILE_CACHE) as f:
+            profiles = json.load(f)
+    except (OSError, ValueError):
+        profiles = {}
+    cached = profiles.get(profile)
+    if cached and cached["tesseract_config"] == tesseract_config and not retune:
+        print(f"auto-tune: using cached preprocessing for profile '{profile}'", file=sys.stderr)
+        return cached["preprocess"]
+
+    options, score = tune_preprocessing(load_sample(), tesseract_config, engine)
+    profiles[profile] = {"preprocess": options, "tesseract_config": tesseract_config, "score": score}
+    os.makedirs(os.path.dirname(PROFILE_CACHE), exist_ok=True)
+    tmp = PROFILE_CACHE + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(profiles, f, indent=2)
+    os.replace(tmp, PROFILE_CACHE)
+    print(f"auto-tune: profile '{profile}' -> {options}", file=sys.stderr)
+    return options
+
+def load_image(image_path):
+    image = cv2.imread(image_path)
+    if image is None:
+        raise ValueError(f"Unable to load image at {image_path}")
+    return image
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Tesseract OCR with Preprocessing Options")
-    parser.add_argument("image_path", type=str, help="Path to the image file")
+    parser.add_argument("image_paths", type=str, nargs="*", metavar="image_path",
+                        help="Path to the image file. Several paths, directories or glob patterns switch to batch mode")
+    parser.add_argument("--file-list", "-L", metavar="FILE",
+                        help="Read more image paths from FILE, one per line ('-' for stdin); implies batch mode")
+    parser.add_argument("--workers", "-w", type=int, default=os.cpu_count(),
+                        help="Number of worker processes in batch mode (default: number of CPU cores)")
     parser.add_argument("--grayscale", "-g", action="store_true", default=True, help="Convert image to grayscale")
     parser.add_argument("--no-grayscale", action="store_false", dest="grayscale", help="Don't convert image to grayscale")
     parser.add_argument("--threshold", "-th", action="store_true", default=True, help="Apply simple thresholding")
@@ -121,11 +971,43 @@ if __name__ == "__main__":
     parser.add_argument("--draw-bounding-boxes", "--dbb", metavar="FILENAME", 
                         help="Draw bounding boxes on the image and save to specified file. Use 'auto' or '-' to automatically name the file as [input_image].bb.png")
     parser.add_argument("--jsonl", "-j", action="store_true", help="Output results in JSONL format (one JSON object per line)")
+    parser.add_argument("--columnar", "-C", metavar="FILE",
+                        help="Also write all word boxes to FILE as a table for analytics; the format follows the extension: "
+                             ".csv, .parquet, .arrow/.feather (needs pyarrow) or .npy")
     parser.add_argument("--auto_preprocess", "--pre", action="store_true", help="Automatically use adaptive thresholding")
     parser.add_argument("--view", "-V", type=str,
                         help="Command line to view bounding box image after generation. If '{}' is present, the bounding box "
                              "image filename will replace '{}'. Otherwise the bounding box image will be appended as the final argument.")
+    parser.add_argument("--dpi", type=int, default=300, help="Rasterisation resolution for PDF input (default: 300)")
+    parser.add_argument("--pages", "-P", metavar="RANGES",
+                        help="Pages of PDF input to OCR, e.g. '1-5,8,20-' (default: all)")
+    parser.add_argument("--auto-tune", "-T", action="store_true",
+                        help="Pick preprocessing automatically by mean word confidence on a downscaled sample of the first "
+                             "input; the choice is cached per --profile so later runs skip the search")
+    parser.add_argument("--profile", default="default",
+                        help="Document profile name for --auto-tune, e.g. 'receipts' (default: 'default')")
+    parser.add_argument("--retune", action="store_true", help="Redo the --auto-tune search even if the profile is cached")
+    parser.add_argument("--tile", type=int, metavar="PIXELS",
+                        help="OCR a single very large image (poster, map) as PIXELS-sized overlapping tiles in parallel "
+                             "(--workers threads); boxes are merged in page coordinates and text is rebuilt line by line")
+    parser.add_argument("--tile-overlap", type=int, default=200, metavar="PIXELS",
+                        help="Overlap between neighbouring tiles; should exceed the largest word (default: 200)")
+    parser.add_argument("--no-cache", action="store_false", dest="cache",
+                        help="Don't reuse or store OCR results in the on-disk cache")
+    parser.add_argument("--cache-dir", default=OCR_CACHE_DIR,
+                        help=f"Directory of the OCR result cache, keyed by image content and settings (default: {OCR_CACHE_DIR})")
+    parser.add_argument("--cache-size", type=int, default=512, metavar="MB",
+                        help="Evict least recently used cache entries beyond this size (default: 512)")
+    parser.add_argument("--engine", "-E", choices=["auto"] + sorted(ENGINES), default="auto",
+                        help="OCR engine: 'tesserocr' keeps libtesseract loaded in-process, 'pytesseract' runs the tesseract "
+                             "binary per call; 'auto' (default) uses tesserocr when installed")
+    parser.add_argument("--benchmark", metavar="GLOB",
+                        help="Time single-pass against two-pass OCR with bounding boxes on all images matching GLOB (e.g. 'scans/*.png') and exit")
     args = parser.parse_args()
+    if not args.image_paths and not args.file_list and not args.benchmark:
+        parser.error("the following arguments are required: image_path")
+    if args.tile is not None and not 0 <= args.tile_overlap < args.tile:
+        parser.error("--tile-overlap must be smaller than --tile")
 
     tesseract_config = f"--psm {args.psm} --oem {args.oem} -l {args.language}"
     preprocess_options = {
@@ -134,53 +1016,116 @@ if __name__ == "__main__":
         "threshold_value": args.threshold_value,
         "adaptive": args.adaptive or args.auto_preprocess
     }
+
+    if args.benchmark:
+        benchmark_paths = sorted(glob.glob(args.benchmark))
+        if not benchmark_paths:
+            parser.error(f"no images match {args.benchmark}")
+        benchmark_single_pass(benchmark_paths, preprocess_options, tesseract_config, args.engine)
+        sys.exit(0)
     
     # If drawing bounding boxes is requested, ensure bounding_boxes is also enabled
-    return_bounding_boxes = args.bounding_boxes or (args.draw_bounding_boxes is not None)
-    
-    # Ensure the output path for drawn bounding boxes has .png extension
-    draw_boxes_path = None
-    if args.draw_bounding_boxes:
-        # Handle special cases for auto-naming
-        if args.draw_bounding_boxes == '-' or args.draw_bounding_boxes.lower() == 'auto':
-            # Generate filename based on input image name
-            base_name = os.path.splitext(args.image_path)[0]
-            draw_boxes_path = f"{base_name}.bb.png"
+    return_bounding_boxes = args.bounding_boxes or (args.draw_bounding_boxes is not None) or bool(args.columnar)
+
+    columnar = None
+    if args.columnar:
+        try:
+            columnar = ColumnarWriter(args.columnar)
+        except ValueError as e:
+            parser.error(str(e))
+
+    cache = OcrCache(args.cache_dir, args.cache_size * 1024 * 1024) if args.cache else None
+    cache_hits = cache_misses = 0
+
+    def emit(result, source=None, page=None, print_source=True):
+        global cache_hits, cache_misses
+        if result.pop("cached", False):
+            cache_hits += 1
         else:
-            draw_boxes_path = args.draw_bounding_boxes
-            if not draw_boxes_path.lower().endswith('.png'):
-                draw_boxes_path += '.png'
+            cache_misses += 1
+        print_result(result, args, source if print_source else None, page)
+        if columnar is not None:
+            columnar.write(result_boxes(result), source, page)
 
-    result = perform_ocr(args.image_path, preprocess_options, tesseract_config, 
-                         return_bounding_boxes, draw_boxes_path)
-    
-    if args.jsonl:
-        # Output full text as first JSONL entry
-        print(json.dumps({"type": "full_text", "text": result["text"]}))
-        
-        # Output each text box as a separate JSONL entry if bounding boxes requested
-        if args.bounding_boxes:
-            for i in range(len(result["data"]["text"])):
-                if result["data"]["text"][i].strip():
-                    box_data = {
-                        "type": "text_box",
-                        "text": result["data"]["text"][i],
-                        "x": result["data"]["left"][i],
-                        "y": result["data"]["top"][i],
-                        "w": result["data"]["width"][i],
-                        "h": result["data"]["height"][i],
-                        "confidence": result["data"]["conf"][i]
-                    }
-                    print(json.dumps(box_data))
+    def close_outputs():
+        if columnar is not None:
+            columnar.close()
+        if cache is not None:
+            removed, size = cache.prune()
+            print(f"OCR cache: {cache_hits} hits, {cache_misses} misses, {removed} entries evicted, "
+                  f"{size / 1024 / 1024:.1f} MB in {cache.directory}", file=sys.stderr)
+
+    def finish(status=0):
+        close_outputs()
+        sys.exit(status)
+
+    pdf_paths = [path for path in args.image_paths if path.lower().endswith(".pdf")]
+    if pdf_paths:
+        if len(pdf_paths) != len(args.image_paths) or args.file_list:
+            parser.error("PDF input cannot be mixed with images or --file-list")
+        if args.tile:
+            parser.error("--tile works on a single image, not PDF input")
+        if args.draw_bounding_boxes and args.draw_bounding_boxes.lower() not in ('-', 'auto'):
+            parser.error("for PDF input --draw-bounding-boxes only supports 'auto' or '-'")
+        if args.auto_tune:
+            def first_page():
+                _, image, error = next(iter_pdf_pages(pdf_paths[0], args.dpi, args.pages))
+                if error is not None:
+                    raise error
+                return image
+
+            preprocess_options = profile_preprocess_options(
+                args.profile, first_page, tesseract_config, args.engine, args.retune)
+        failed = 0
+        for pdf_path in pdf_paths:
+            for page_number, result, error in ocr_pdf(pdf_path, args.workers, args.dpi, args.pages,
+                                                      preprocess_options, tesseract_config, return_bounding_boxes,
+                                                      args.draw_bounding_boxes, args.engine, cache):
+                if error is not None:
+                    failed += 1
+                    print(f"ERROR: {pdf_path} page {page_number}: {error}", file=sys.stderr)
+                else:
+                    emit(result, source=pdf_path, page=page_number)
+        finish(1 if failed else 0)
+
+    if is_batch_input(args.image_paths, args.file_list):
+        if args.draw_bounding_boxes and args.draw_bounding_boxes.lower() not in ('-', 'auto'):
+            parser.error("in batch mode --draw-bounding-boxes only supports 'auto' or '-'")
+        if args.tile:
+            parser.error("--tile works on a single image, not in batch mode")
+        image_paths = expand_image_paths(args.image_paths, args.file_list)
+        if args.auto_tune:
+            first_path = next(image_paths, None)
+            if first_path is not None:
+                image_paths = itertools.chain([first_path], image_paths)
+                preprocess_options = profile_preprocess_options(
+                    args.profile, lambda: load_image(first_path), tesseract_config, args.engine, args.retune)
+        failed = 0
+        for image_path, result, error in ocr_batch(image_paths, args.workers,
+                                                   preprocess_options, tesseract_config,
+                                                   return_bounding_boxes, args.draw_bounding_boxes, args.engine, cache):
+            if error is not None:
+                failed += 1
+                print(f"ERROR: {image_path}: {error}", file=sys.stderr)
+            else:
+                emit(result, source=image_path)
+        finish(1 if failed else 0)
+
+    image_path = args.image_paths[0]
+    draw_boxes_path = bounding_box_image_path(image_path, args.draw_bounding_boxes)
+    if args.auto_tune:
+        preprocess_options = profile_preprocess_options(
+            args.profile, lambda: load_image(image_path), tesseract_config, args.engine, args.retune)
+
+    if args.tile:
+        result = ocr_tiled(load_image(image_path), preprocess_options, tesseract_config, args.tile, args.tile_overlap,
+                           args.workers, return_bounding_boxes, draw_boxes_path, args.engine)
     else:
-        # Original human-readable output format
-        print("Extracted Text:", result["text"])
-        if args.bounding_boxes and "data" in result:
-            print("\nBounding Box Data:")
-            for i in range(len(result["data"]["text"])):
-                if result["data"]["text"][i].strip():
-                    print(f"Text: '{result['data']['text'][i]}' | Box: [{result['data']['left'][i]}, {result['data']['top'][i]}, {result['data']['width'][i]}, {result['data']['height'][i]}] | Confidence: {result['data']['conf'][i]}")
-    
+        result = perform_ocr(image_path, preprocess_options, tesseract_config,
+                             return_bounding_boxes, draw_boxes_path, engine=args.engine, cache=cache)
+    emit(result, source=image_path, print_source=False)
+    close_outputs()
+
     # If we generated a bounding box image and the user wants to view it, run the specified command
     if draw_boxes_path and args.view:
         if '{}' in args.view:
@@ -1,13 +1,15 @@
 #!/usr/bin/env python3
 import os
-import queue
-import tempfile
+import threading
 import time
 import argparse
 import shutil
 import subprocess
+import sys
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from openai import OpenAI
+from stt_audio_frontend import AUDIO_FORMATS, AudioFrontEnd, EnergyVAD, encode_audio, save_audio, wait_for_enter
 
 # Argument parsing
 parser = argparse.ArgumentParser(description='OpenAI STT/ASR CLI (Voice to Text)')
@@ -15,6 +17,15 @@ parser.add_argument('-s', '--silent', action='store_true', help='Run in silent m
 parser.add_argument('-o', '--output', type=str, help='Specify output file for transcript')
 parser.add_argument('-a', '--append', type=str, help='Specify output file to append transcript')
 parser.add_argument('-c', '--clipboard', action='store_true', help='Copy result to clipboard using xclip')
+parser.add_argument('-k', '--keep', type=str, help='Also save the recording to this audio file')
+parser.add_argument('-A', '--auto-stop', type=float, metavar='SECONDS', help='Stop recording after this many seconds of silence following speech')
+parser.add_argument('--no-trim', action='store_true', help='Upload the whole recording instead of trimming leading/trailing silence')
+parser.add_argument('-f', '--format', choices=sorted(AUDIO_FORMATS), default='wav', help='Audio format used for upload (default: wav)')
+parser.add_argument('-S', '--stream', action='store_true', help='Cut recording at pauses and transcribe segments in the background while still recording')
+parser.add_argument('--pause', type=float, default=0.8, help='Seconds of silence that end a segment in --stream mode (default: 0.8)')
+parser.add_argument('--min-segment', type=float, default=3.0, help='Minimum segment length in seconds in --stream mode (default: 3.0)')
+parser.add_argument('--silence-rms', type=float, default=0.005, help='RMS below which a 30ms frame never counts as speech for the voice activity detector (default: 0.005)')
+parser.add_argument('--workers', type=int, default=2, help='Number of segments transcribed in parallel in --stream mode (default: 2)')
 args = parser.parse_args()
 
 client = OpenAI()
@@ -24,6 +35,7 @@ try:
 except (OSError, ModuleNotFoundError):
     sf = None
 
+from prompt_toolkit.application import get_app
 from prompt_toolkit.shortcuts import prompt
 
 # from .dump import dump  # noqa: F401
@@ -34,10 +46,6 @@ class SoundDeviceError(Exception):
 
 
 class Voice:
-    max_rms = 0
-    min_rms = 1e5
-    pct = 0
-
     threshold = 0.15
 
     def __init__(self):
@@ -53,26 +61,18 @@ class Voice:
             print(f"An error occurred while initializing the sound device: {e}")
             raise SoundDeviceError("Failed to initialize the sound device.")
 
-    def callback(self, indata, frames, time, status):
-        """This is called (from a separate thread) for each audio block."""
-        rms = np.sqrt(np.mean(indata**2))
-        self.max_rms = max(self.max_rms, rms)
-        self.min_rms = min(self.min_rms, rms)
-
-        rng = self.max_rms - self.min_rms
-        if rng > 0.001:
-            self.pct = (rms - self.min_rms) / rng
-        else:
-            self.pct = 0.5
-
-        self.q.put(indata.copy())
-
     def get_prompt(self):
+        if self.frontend.auto_stopped.is_set():
+            app = get_app()
+            if not app.is_done:
+                app.exit(result="")
+
         num = 10
-        if np.isnan(self.pct) or self.pct < self.threshold:
+        pct = self.frontend.pct
+        if np.isnan(pct) or pct < self.threshold:
             cnt = 0
         else:
-            cnt = int(self.pct * 10)
+            cnt = int(pct * 10)
 
         #bar = "░" * cnt + "█" * (num - cnt)
         bar = "#" * cnt + "_" * (num - cnt)
@@ -85,36 +85,128 @@ class Voice:
     # which is triggered by pressing [Ctrl]+[C]. When caught, it simply returns
     # from the function without proceeding to the transcription step.
 
-    def raw_record_and_transcribe(self, history, language):
-        self.q = queue.Queue()
-
-        filename = tempfile.mktemp(suffix=".wav")
+    def record(self, sample_rate):
+        """Record into self.buffer until ENTER is pressed (or --auto-stop kicks in)."""
+        self.frontend.start()
+        try:
+            with self.sd.InputStream(samplerate=sample_rate, channels=1, callback=self.frontend.callback):
+                if not args.silent:
+                    prompt(self.get_prompt, refresh_interval=0.1)
+                elif args.auto_stop:
+                    wait_for_enter(self.frontend.auto_stopped)
+                else:
+                    #input("Press ENTER to stop recording...")
+                    input("") # silently wait for ENTER in silent mode.
+        finally:
+            self.frontend.stop()
+
+    def new_frontend(self, sample_rate):
+        vad = EnergyVAD(sample_rate, min_rms=args.silence_rms)
+        self.frontend = AudioFrontEnd(sample_rate, auto_stop=args.auto_stop, vad=vad)
+        self.buffer = self.frontend.buffer
+
+    def keep_recording(self):
+        if args.keep:
+            save_audio(self.buffer.view(), self.buffer.sample_rate, args.keep)
+
+    def transcribe_audio(self, samples, sample_rate):
+        """Encode samples in memory and transcribe them."""
+        audio_file = encode_audio(samples, sample_rate, args.format)
+        transcript = client.audio.transcriptions.create(model="whisper-1", file=audio_file)
+        return transcript.text
 
+    def raw_record_and_transcribe(self, history, language):
         sample_rate = 16000  # 16kHz
+        self.new_frontend(sample_rate)
 
         self.start_time = time.time()
+        self.record(sample_rate)
+        self.keep_recording()
 
-        with self.sd.InputStream(samplerate=sample_rate, channels=1, callback=self.callback):
-            if not args.silent:
-                prompt(self.get_prompt, refresh_interval=0.1)
-            else:
-                #input("Press ENTER to stop recording...")
-                input("") # silently wait for ENTER in silent mode.
-
-        # Only proceed with transcription if there are audio frames in the queue
-        if not self.q.empty():
-            with sf.SoundFile(filename, mode="x", samplerate=sample_rate, channels=1) as file:
-                while not self.q.empty():
-                    file.write(self.q.get())
-
-            with open(filename, "rb") as fh:
-                transcript = client.audio.transcriptions.create(model="whisper-1", file=fh)
-            transcript_text = transcript.text
+        # Only proceed with transcription if there are audio frames in the buffer
+        if len(self.buffer):
+            audio = self.buffer.view() if args.no_trim else self.frontend.speech_view()
+            transcript_text = self.transcribe_audio(audio, sample_rate)
         else:
             transcript_text = "No audio recorded."
 
         return transcript_text
 
+    def segment_stream(self, sample_rate, executor, futures, stop, abort, pad=0.3):
+        """Cut the growing buffer into segments at pauses and submit them for transcription.
+
+        Runs in its own thread while recording and follows the front end's
+        VAD. A segment is closed once it is at least `--min-segment` seconds
+        long and `--pause` seconds have passed since speech ended. Segments
+        are trimmed to their speech plus `pad` seconds (the whole span with
+        --no-trim), and stretches without speech are never sent to the API.
+        """
+        vad = self.frontend.vad
+        pad_frames = int(pad * sample_rate)
+        min_frames = int(args.min_segment * sample_rate)
+        seg_start = seen = 0
+        runs = []
+
+        def submit(end):
+            # `end` is where this segment's audio stops at the latest.
+            if args.no_trim:
+                start = seg_start
+            else:
+                start = max(seg_start, runs[0][0] - pad_frames)
+                end = min(end, runs[-1][1] + pad_frames)
+            futures.append(executor.submit(self.transcribe_audio, self.buffer.view(start, end), sample_rate))
+            return end
+
+        while not stop.wait(0.05):
+            finished = vad.speech_runs[seen:]
+            runs += finished
+            seen += len(finished)
+            if runs and vad.silence_after_speech() >= args.pause and runs[-1][1] - seg_start >= min_frames:
+                seg_start = submit(vad.pos)
+                runs = []
+
+        # After ENTER only this last segment is left to transcribe. The front
+        # end has stopped, so the VAD has seen every frame.
+        runs += vad.speech_runs[seen:]
+        if vad.speech:
+            runs.append((vad.run_start, vad.last_speech))
+        if runs and not abort.is_set():
+            submit(len(self.buffer))
+
+    def raw_record_and_transcribe_streaming(self, history, language):
+        sample_rate = 16000  # 16kHz
+        self.new_frontend(sample_rate)
+
+        futures = []
+        stop = threading.Event()
+        abort = threading.Event()
+        executor = ThreadPoolExecutor(max_workers=args.workers)
+        segmenter = threading.Thread(target=self.segment_stream,
+                                     args=(sample_rate, executor, futures, stop, abort), daemon=True)
+
+        self.start_time = time.time()
+        segmenter.start()
+
+        try:
+            self.record(sample_rate)
+        except KeyboardInterrupt:
+            abort.set()
+            raise
+        finally:
+            stop.set()
+            segmenter.join()
+            executor.shutdown(wait=not abort.is_set(), cancel_futures=abort.is_set())
+        self.keep_recording()
+
+        # A failed segment is reported and left out; the others are kept.
+        texts = []
+        for number, future in enumerate(futures, 1):
+            try:
+                texts.append(future.result().strip())
+            except Exception as e:
+                print(f"Error: segment {number} of {len(futures)} failed: {e}", file=sys.stderr)
+        transcript_text = " ".join(text for text in texts if text)
+        return transcript_text if transcript_text else "No audio recorded."
 
 if __name__ == "__main__":
     api_key = os.getenv("OPENAI_API_KEY")
@@ -122,7 +214,11 @@ if __name__ == "__main__":
         raise ValueError("Please set the OPENAI_API_KEY environment variable.")
     # print(Voice().record_and_transcribe()) #original line
     try:
-        transcript = Voice().raw_record_and_transcribe(history="", language="en")
+        voice = Voice()
+        if args.stream:
+            transcript = voice.raw_record_and_transcribe_streaming(history="", language="en")
+        else:
+            transcript = voice.raw_record_and_transcribe(history="", language="en")
         # Handle output based on the silent mode and output file argument
     except KeyboardInterrupt:
         print("\nRecording interrupted by user.")
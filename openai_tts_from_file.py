@@ -1,33 +1,192 @@
 #!/usr/bin/env python
 import sys
 import os
+import re
+import hashlib
+import json
+import argparse
+import shutil
+import tempfile
+import wave
+from concurrent.futures import ThreadPoolExecutor
 from openai import OpenAI
+from script_cache import cache_dir
+from tts_audio import ffmpeg_concat, is_anchor, strip_id3
+
+CACHE_DIR = cache_dir("tts")
+
+# Input limit of the speech endpoint, in characters
+MAX_INPUT_CHARS = 4096
+
+# Raw PCM returned for response_format="pcm": 24kHz, 16-bit, mono
+PCM_RATE = 24000
+
+# --format -> (response_format requested from the API, output extension)
+FORMATS = {
+    "mp3": ("mp3", "mp3"),
+    "opus": ("opus", "opus"),
+    "aac": ("aac", "aac"),
+    "flac": ("flac", "flac"),
+    "wav": ("pcm", "wav"),
+    "pcm": ("pcm", "pcm"),
+}
+
+def split_long(text, limit):
+    """Split text that has no usable sentence boundary at whitespace, or hard at `limit`."""
+    pieces = []
+    while len(text) > limit:
+        cut = text.rfind(" ", 0, limit + 1)
+        if cut <= 0:
+            cut = limit
+        pieces.append(text[:cut].strip())
+        text = text[cut:].strip()
+    if text:
+        pieces.append(text)
+    return pieces
+
+def chunk_text(text, limit=MAX_INPUT_CHARS):
+    """Split text into chunks of at most `limit` characters at paragraph and sentence boundaries.
+
+    Paragraphs are packed together while they fit; a paragraph that does
+    not fit is split into sentences, and a sentence that does not fit is
+    split at whitespace. Chunks also end after "anchor" paragraphs picked
+    by their content hash, so an edit only changes the chunks up to the
+    next anchor and the rest of the document still hits the audio cache.
+    """
+    chunks = []
+    current = ""
+
+    def add(piece, separator):
+        nonlocal current
+        if current and len(current) + len(separator) + len(piece) <= limit:
+            current += separator + piece
+        else:
+            if current:
+                chunks.append(current)
+            current = piece
+
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph) <= limit:
+            add(paragraph, "\n\n")
+            if is_anchor(paragraph, 4):
+                chunks.append(current)
+                current = ""
+            continue
+        for i, sentence in enumerate(re.split(r"(?<=[.!?…])\s+", paragraph)):
+            for j, piece in enumerate(split_long(sentence, limit)):
+                add(piece, "\n\n" if i == j == 0 else " ")
+    if current:
+        chunks.append(current)
+    return chunks
+
+def join_audio(parts, fmt, output_file):
+    """Write the chunk audio `parts` to output_file in order, without re-encoding.
+
+    MP3 and ADTS AAC frames are self-contained and are concatenated as
+    bytes; PCM is concatenated raw (and given a WAV header for wav).
+    Containers that cannot be byte-joined (FLAC, Ogg Opus) are
+    stream-copied by ffmpeg's concat demuxer.
+    """
+    if fmt == "wav":
+        with wave.open(output_file, "wb") as w:
+            w.setnchannels(1)
+            w.setsampwidth(2)
+            w.setframerate(PCM_RATE)
+            for part in parts:
+                w.writeframes(part)
+    elif len(parts) == 1 or fmt in ("mp3", "aac", "pcm"):
+        with open(output_file, "wb") as f:
+            for i, part in enumerate(parts):
+                f.write(strip_id3(part) if fmt == "mp3" and i else part)
+    else:
+        if shutil.which("ffmpeg") is None:
+            raise RuntimeError(f"joining {fmt} chunks needs ffmpeg; use --format mp3, aac or wav instead")
+        with open(output_file, "wb") as f:
+            f.write(ffmpeg_concat(parts, fmt))
+
+def cache_path(text, args):
+    """Cache file for the audio of one chunk, addressed by its text, model, voice and format."""
+    response_format = FORMATS[args.format][0]
+    key = hashlib.sha256(json.dumps([text, args.model, args.voice, response_format]).encode()).hexdigest()
+    return os.path.join(args.cache_dir, key[:2], f"{key}.{response_format}")
+
+def synthesize(client, text, args):
+    """Audio bytes for one chunk of text, and whether they came from the cache."""
+    path = cache_path(text, args) if args.cache else None
+    if path and os.path.exists(path):
+        with open(path, "rb") as f:
+            return f.read(), True
+
+    response = client.audio.speech.create(
+        model=args.model,
+        voice=args.voice,
+        input=text,
+        response_format=FORMATS[args.format][0],
+    )
+    audio = response.content
+    if path:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(audio)
+        os.replace(tmp, path)
+    return audio, False
 
 def main():
-    if len(sys.argv) == 1:
-        sys.stderr.write("Usage: {} <file1> [<file2> ...]\n".format(sys.argv[0]))
-        sys.exit(1)
+    parser = argparse.ArgumentParser(
+        description="Convert text files to speech with OpenAI TTS. Long texts are split at sentence and paragraph "
+                    "boundaries, the chunks of all files are synthesised concurrently and joined in order.")
+    parser.add_argument("files", nargs="+", metavar="file", help="Text files; each produces <file>.<format> next to it")
+    parser.add_argument("-w", "--workers", type=int, default=4, help="Concurrent TTS requests (default: 4)")
+    parser.add_argument("-f", "--format", choices=FORMATS, default="mp3", help="Output audio format (default: mp3)")
+    parser.add_argument("-m", "--model", default="tts-1", help="TTS model (default: tts-1)")
+    parser.add_argument("-v", "--voice", default="alloy", help="Voice (default: alloy)")
+    parser.add_argument("--no-cache", action="store_false", dest="cache",
+                        help="Don't reuse or store synthesised chunks in the audio cache")
+    parser.add_argument("--cache-dir", default=CACHE_DIR,
+                        help=f"Chunk audio cache, keyed by chunk text, model, voice and format (default: {CACHE_DIR})")
+    parser.add_argument("--max-chars", type=int, default=MAX_INPUT_CHARS,
+                        help=f"Maximum characters per request (default: {MAX_INPUT_CHARS}, the API limit)")
+    args = parser.parse_args()
 
     client = OpenAI()
+    failed = False
 
-    for file_path in sys.argv[1:]:
-        if os.path.isfile(file_path) and os.access(file_path, os.R_OK):
-            sys.stderr.write("Processing file: {}\n".format(file_path))
-            with open(file_path, 'r') as file:
-                file_contents = file.read()
-
-            response = client.audio.speech.create(
-                model="tts-1",
-                voice="alloy",
-                input=file_contents,
-            )
+    # Chunks of every file go to one pool, so several files are rendered at once.
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        jobs = []
+        for file_path in args.files:
+            if os.path.isfile(file_path) and os.access(file_path, os.R_OK):
+                with open(file_path, 'r') as file:
+                    chunks = chunk_text(file.read(), args.max_chars)
+                if not chunks:
+                    sys.stderr.write("Error: File {} has no text to convert.\n".format(file_path))
+                    failed = True
+                    continue
+                sys.stderr.write("Processing file: {} ({} chunks)\n".format(file_path, len(chunks)))
+                jobs.append((file_path, [executor.submit(synthesize, client, chunk, args) for chunk in chunks]))
+            else:
+                sys.stderr.write("Error: File {} is not readable or does not exist.\n".format(file_path))
+                failed = True
 
+        for file_path, futures in jobs:
             base_name, _ = os.path.splitext(file_path)
-            output_file = base_name + ".mp3"
-            response.stream_to_file(output_file)
-            sys.stderr.write("Output saved to: {}\n".format(output_file))
-        else:
-            sys.stderr.write("Error: File {} is not readable or does not exist.\n".format(file_path))
+            output_file = base_name + "." + FORMATS[args.format][1]
+            try:
+                results = [future.result() for future in futures]
+                join_audio([audio for audio, _ in results], args.format, output_file)
+            except Exception as e:
+                sys.stderr.write("Error: {}: {}\n".format(file_path, e))
+                failed = True
+                continue
+            cached = sum(hit for _, hit in results)
+            sys.stderr.write("Output saved to: {} ({} of {} chunks from cache)\n".format(output_file, cached, len(results)))
+
+    if failed:
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
@@ -1,60 +1,191 @@
 #!/usr/bin/env python3
 
 import argparse
+import hashlib
 import os
 import sys
 import json
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import requests
 import replicate
+from script_cache import cache_dir
+
+CACHE_DIR = cache_dir("pdf_ocr_replicate")
+
+# model name -> (Replicate model version, builder of the input dict from the open PDF and its path)
+OCR_MODELS = {
+    "cuuupid-marker": (
+        "cuuupid/marker:9c67051309f6d10ca139489f15fcb5ebc4866a3734af537c181fb13bc719d280",
+        lambda pdf, path: {
+            "dpi": 400,
+            "lang": "English",
+            "document": pdf,
+            "enable_editor": False,
+            "parallel_factor": 10
+        },
+    ),
+    "cudanexus-nougat": (
+        "cudanexus/nougat:d0b4e90da423598ff84debc9115bf891dd819843600ad842c0c178e3571f9e76",
+        lambda pdf, path: {"pdf_file": pdf},
+    ),
+    "awilliamson10-meta-nougat": (
+        "awilliamson10/meta-nougat:872fa99400b0eeb8bfc82ef433aa378976b4311178ff64fed439470249902071",
+        lambda pdf, path: {"pdf_link": path},
+    ),
+}
 
 def available_ocr_models():
-    return ["cuuupid-marker", "cudanexus-nougat", "awilliamson10-meta-nougat"]
-
-def generate_ocr(input_file, output_file, model):
-    if model == "cuuupid-marker":
-        output = replicate.run(
-            "cuuupid/marker:9c67051309f6d10ca139489f15fcb5ebc4866a3734af537c181fb13bc719d280",
-            input={
-                "dpi": 400,
-                "lang": "English",
-                "document": open(input_file, "rb"),
-                "enable_editor": False,
-                "parallel_factor": 10
-            }
-        )
-    elif model == "cudanexus-nougat":
-        output = replicate.run(
-            "cudanexus/nougat:d0b4e90da423598ff84debc9115bf891dd819843600ad842c0c178e3571f9e76",
-            input={"pdf_file": open(input_file, "rb")}
-        )
-    elif model == "awilliamson10-meta-nougat":
-        output = replicate.run(
-            "awilliamson10/meta-nougat:872fa99400b0eeb8bfc82ef433aa378976b4311178ff64fed439470249902071",
-            input={"pdf_link": input_file}
-        )
-    else:
+    return list(OCR_MODELS)
+
+def pdf_digest(input_file):
+    digest = hashlib.sha256()
+    with open(input_file, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def cache_path(digest, version):
+    """Cache file for the output and markdown of one model version on one PDF."""
+    return os.path.join(CACHE_DIR, digest, hashlib.sha256(version.encode()).hexdigest()[:16] + ".result.json")
+
+def fetch_markdown(output):
+    """Download the markdown a model output points to, or None when it has none."""
+    markdown_url = output.get('markdown')
+    if not markdown_url:
+        return None
+    response = requests.get(markdown_url)
+    response.raise_for_status()
+    return response.text
+
+def run_model(input_file, model, digest=None, refresh=False):
+    """Run a model on the PDF and download its markdown; returns (output, markdown).
+
+    Both are cached for this PDF and model version. The markdown text is
+    cached rather than its delivery URL, which expires, and nothing is
+    cached unless the download succeeded. With `refresh` the cached entry
+    is dropped and the model is run again.
+    """
+    if model not in OCR_MODELS:
         raise ValueError(f"Unsupported model: {model}")
+    version, make_input = OCR_MODELS[model]
+    path = cache_path(digest or pdf_digest(input_file), version)
+    if refresh and os.path.exists(path):
+        os.remove(path)
+    try:
+        with open(path) as f:
+            cached = json.load(f)
+        print(f"{model}: using cached result {path}", file=sys.stderr)
+        return cached["output"], cached["markdown"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    with open(input_file, "rb") as pdf:
+        output = replicate.run(version, input=make_input(pdf, input_file))
+    markdown = fetch_markdown(output)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump({"output": output, "markdown": markdown}, f)
+    os.replace(tmp, path)
+    return output, markdown
+
+def split_pdf(input_file, pages_per_shard, shard_dir):
+    """Write the PDF as shards of pages_per_shard pages; returns [(first_page, last_page, shard_path)]."""
+    try:
+        from pypdf import PdfReader, PdfWriter
+    except ImportError:
+        print("Error: sharding needs pypdf (pip install pypdf)", file=sys.stderr)
+        sys.exit(1)
+    reader = PdfReader(input_file)
+    shards = []
+    for first in range(0, len(reader.pages), pages_per_shard):
+        last = min(first + pages_per_shard, len(reader.pages))
+        writer = PdfWriter()
+        for page in reader.pages[first:last]:
+            writer.add_page(page)
+        shard_path = os.path.join(shard_dir, f"pages-{first + 1:05d}-{last:05d}.pdf")
+        with open(shard_path, "wb") as f:
+            writer.write(f)
+        shards.append((first + 1, last, shard_path))
+    return shards
+
+def ocr_shard(shard_path, model, retries, digest):
+    """OCR one shard, retrying it alone with exponential backoff; returns (output, markdown).
+
+    Retries bypass the shard's cache entry, so a bad entry cannot fail
+    every attempt.
+    """
+    for attempt in range(retries + 1):
+        try:
+            return run_model(shard_path, model, digest, refresh=attempt > 0)
+        except Exception as e:
+            if attempt == retries:
+                raise
+            delay = 2 ** attempt
+            print(f"{model}: {os.path.basename(shard_path)} failed ({e}), retrying in {delay}s", file=sys.stderr)
+            time.sleep(delay)
+
+def run_sharded(input_file, model, pages_per_shard, max_concurrent=4, retries=2, digest=None):
+    """OCR the PDF as concurrent page-range shards and stitch the results in page order.
+
+    Returns (outputs, markdown): one {"pages": [first, last], "output": ...}
+    per shard, and the joined markdown (None if no shard produced any).
+    Shard results are cached by the PDF hash and page range, so a rerun
+    after a partial failure only resubmits the shards that failed.
+    """
+    digest = digest or pdf_digest(input_file)
+    with tempfile.TemporaryDirectory(prefix="pdf_ocr_shards_") as shard_dir:
+        shards = split_pdf(input_file, pages_per_shard, shard_dir)
+        print(f"{model}: {len(shards)} shards of up to {pages_per_shard} pages", file=sys.stderr)
+        with ThreadPoolExecutor(max_workers=max_concurrent) as executor:
+            futures = [executor.submit(ocr_shard, shard_path, model, retries, f"{digest}-p{first}-{last}")
+                       for first, last, shard_path in shards]
+            results, failed = [], []
+            for (first, last, _), future in zip(shards, futures):
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    failed.append(f"pages {first}-{last}: {e}")
+    if failed:
+        raise RuntimeError(f"{len(failed)} of {len(shards)} shards failed; rerun to retry them only:\n" + "\n".join(failed))
+
+    outputs = [{"pages": [first, last], "output": output} for (first, last, _), (output, _) in zip(shards, results)]
+    parts = [markdown for _, markdown in results if markdown]
+    return outputs, "\n\n".join(parts) if parts else None
+
+def generate_ocr(input_file, output_file, model, digest=None, shard_pages=None, max_concurrent=4, retries=2):
+    if shard_pages:
+        output, markdown = run_sharded(input_file, model, shard_pages, max_concurrent, retries, digest)
+    else:
+        output, markdown = run_model(input_file, model, digest)
 
     json_output_file = output_file.rsplit('.', 1)[0] + '.json'
     with open(json_output_file, "w") as f:
         json.dump(output, f)
 
-    markdown_url = output.get('markdown')
-    if markdown_url:
-        response = requests.get(markdown_url)
-        response.raise_for_status()
+    if markdown is not None:
         with open(output_file, "w") as f:
-            f.write(response.text)
+            f.write(markdown)
     else:
-        print("No markdown URL found in the server response.")
+        print(f"{model}: No markdown URL found in the server response.")
 
 def main():
     parser = argparse.ArgumentParser(description="OCR PDF to Markdown converter")
     parser.add_argument("input_file", help="Input PDF file")
     parser.add_argument("-o", "--output", help="Custom output filename")
-    parser.add_argument("-m", "--model", choices=available_ocr_models(), default="marker", help="OCR model to use")
-    parser.add_argument("--all", action='store_true', help="Run processing through all available OCR models")
+    parser.add_argument("-m", "--model", choices=available_ocr_models(), default="cuuupid-marker", help="OCR model to use")
+    parser.add_argument("--all", action='store_true',
+                        help="Run all available OCR models concurrently; models with a cached result for this PDF are not called again")
     parser.add_argument("-D", "--output-dir", help="Output directory")
+    parser.add_argument("--shard-pages", type=int, metavar="N",
+                        help="Split the PDF into N-page shards (needs pypdf), OCR them as concurrent predictions and "
+                             "stitch the markdown back in page order; a failed shard is retried on its own")
+    parser.add_argument("--max-concurrent", type=int, default=4,
+                        help="Maximum shards in flight per model with --shard-pages (default: 4)")
+    parser.add_argument("--retries", type=int, default=2, help="Retries per failed shard (default: 2)")
     args = parser.parse_args()
 
     if not os.path.exists(args.input_file):
@@ -81,16 +212,39 @@ def main():
             print("Operation cancelled.")
             sys.exit(0)
 
+    digest = pdf_digest(args.input_file)
     if args.all:
+        jobs = {}
         for model in available_ocr_models():
-            model_output_file = os.path.join(output_dir, output_file.rsplit('.', 1)[0] + f'.{model}.md')
+            # output_file already includes output_dir
+            model_output_file = output_file.rsplit('.', 1)[0] + f'.{model}.md'
             model_json_output_file = model_output_file.rsplit('.', 1)[0] + '.md.json'
             if os.path.exists(model_output_file) or os.path.exists(model_json_output_file):
                 print(f"Warning: Output file '{model_output_file}' or '{model_json_output_file}' already exists. Skipping model {model}.")
                 continue
-            generate_ocr(args.input_file, model_output_file, model)
+            jobs[model] = model_output_file
+
+        failed = 0
+        with ThreadPoolExecutor(max_workers=max(len(jobs), 1)) as executor:
+            futures = {executor.submit(generate_ocr, args.input_file, model_output_file, model, digest,
+                                       args.shard_pages, args.max_concurrent, args.retries): model
+                       for model, model_output_file in jobs.items()}
+            for future in as_completed(futures):
+                model = futures[future]
+                try:
+                    future.result()
+                    print(f"{model}: done -> {jobs[model]}")
+                except Exception as e:
+                    failed += 1
+                    print(f"{model}: failed: {e}", file=sys.stderr)
+        if failed:
+            sys.exit(1)
     else:
-        generate_ocr(args.input_file, output_file, args.model)
+        try:
+            generate_ocr(args.input_file, output_file, args.model, digest, args.shard_pages, args.max_concurrent, args.retries)
+        except RuntimeError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
 
 if __name__ == "__main__":
     main()
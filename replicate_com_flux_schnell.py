@@ -1,11 +1,16 @@
 #!/usr/bin/env python3
 
 import argparse
+import hashlib
+import json
 import os
 import sys
-import requests
+import threading
+import time
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ThreadPoolExecutor, wait
 import replicate
 import re
+from image_download import RateLimiter, stream_download
 
 def normalize_filename(prompt, max_length=64):
     """Normalize prompt to a valid filename."""
@@ -27,16 +32,23 @@ def generate_output_filename(prompt, output):
         base_name = normalize_filename(prompt)
     return base_name
 
-def determine_file_format(content):
-    """Determine file format based on content."""
-    if content.startswith(b'\x89PNG\r\n\x1a\n'):
-        return 'png'
-    elif content.startswith(b'\xFF\xD8'):
-        return 'jpg'
-    elif content.startswith(b'RIFF') and content[8:12] == b'WEBP':
-        return 'webp'
-    else:
-        return 'unknown'
+def raster_path(base_name):
+    """path_for_format() for stream_download(): base_name plus a raster image extension."""
+    def path_for_format(ext):
+        if ext not in ('png', 'jpg', 'webp'):
+            raise ValueError("Unable to determine file format.")
+        return f"{base_name}.{ext}"
+    return path_for_format
+
+def fetch_image(prompt, base_name, seed=None):
+    """Run flux-schnell for one prompt and stream the image to base_name.<ext>; returns the path."""
+    model_input = {"prompt": prompt}
+    if seed is not None:
+        model_input["seed"] = seed
+    output = replicate.run("black-forest-labs/flux-schnell", input=model_input)
+    if not (isinstance(output, list) and len(output) > 0):
+        raise RuntimeError("No output received from the API.")
+    return stream_download(output[0], raster_path(base_name))
 
 def generate_image(prompt, output_file, verbose=False, force=False):
     """Generate image using Replicate API."""
@@ -50,47 +62,185 @@ def generate_image(prompt, output_file, verbose=False, force=False):
         sys.exit(1)
 
     try:
-        output = replicate.run(
-            "black-forest-labs/flux-schnell",
-            input={"prompt": prompt}
-        )
-
-        if isinstance(output, list) and len(output) > 0:
-            image_url = output[0]
-            response = requests.get(image_url)
-            response.raise_for_status()
-            content = response.content
-
-            ext = determine_file_format(content)
-            if ext == 'unknown':
-                print("Error: Unable to determine file format.", file=sys.stderr)
-                sys.exit(1)
-
-            final_output_file = f"{base_name}.{ext}"
-            with open(final_output_file, "wb") as f:
-                f.write(content)
-
-            if verbose:
-                print(f"Image saved as: {final_output_file}", file=sys.stderr)
-            # always print path of enerated image to stdout, so can be consumed by caller of application,
-            # and in non verbose mode, on success path it should be only this.
-            print(f"{final_output_file}")
-        else:
-            print("Error: No output received from the API.", file=sys.stderr)
-            sys.exit(1)
+        final_output_file = fetch_image(prompt, base_name)
+
+        if verbose:
+            print(f"Image saved as: {final_output_file}", file=sys.stderr)
+        # always print path of enerated image to stdout, so can be consumed by caller of application,
+        # and in non verbose mode, on success path it should be only this.
+        print(f"{final_output_file}")
 
     except Exception as e:
         print(f"Error: {str(e)}", file=sys.stderr)
         sys.exit(1)
 
+def read_prompts(path):
+    """Yield {"prompt", "output"?, "seed"?} jobs from a prompt file ('-' for stdin).
+
+    Lines holding a JSON object are JSONL jobs; any other non-empty line,
+    including one that merely starts with '{', is a plain prompt.
+    """
+    f = sys.stdin if path == "-" else open(path)
+    with f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            job = None
+            if line.startswith("{"):
+                try:
+                    job = json.loads(line)
+                except json.JSONDecodeError:
+                    pass
+            if isinstance(job, dict):
+                if "prompt" not in job:
+                    print(f"WARNING: {path}:{line_number}: no 'prompt' key, skipped", file=sys.stderr)
+                    continue
+                yield job
+            else:
+                yield {"prompt": line}
+
+def job_key(job):
+    """Manifest key: hash of the prompt and the requested seed."""
+    return hashlib.sha256(json.dumps([job["prompt"], job.get("seed")]).encode()).hexdigest()
+
+class Manifest:
+    """Append-only JSONL record of finished batch jobs, loaded into a dict keyed by job_key()."""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        complete = True
+        if os.path.exists(path):
+            with open(path) as f:
+                for line_number, line in enumerate(f, 1):
+                    complete = line.endswith("\n")
+                    if not line.strip():
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A run killed mid-write leaves a truncated last line.
+                        print(f"WARNING: {path}:{line_number}: unreadable manifest entry, skipped", file=sys.stderr)
+                        continue
+                    self.entries[entry["key"]] = entry
+        self.lock = threading.Lock()
+        self.file = open(path, "a")
+        if not complete:
+            self.file.write("\n")
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def add(self, entry):
+        with self.lock:
+            self.entries[entry["key"]] = entry
+            self.file.write(json.dumps(entry) + "\n")
+            self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+def batch_generate(prompt_file, manifest_path, workers=4, rpm=None, verbose=False, force=False):
+    """Generate images for every prompt in prompt_file concurrently; returns the number of failures.
+
+    Prompts already recorded in the manifest are skipped without touching
+    the disk. New base names are checked against one listing of each
+    output directory, and names used during the run are reserved in memory,
+    so two prompts that normalise to the same name get '-2', '-3', ...
+    `force` only allows overwriting files from before the run; names are
+    still unique within the batch.
+    """
+    manifest = Manifest(manifest_path)
+    limiter = RateLimiter(60 / rpm if rpm else 0)
+    existing = {os.path.splitext(entry["output"])[0] for entry in manifest.entries.values()}
+    reserved = set()
+    listed = set()
+    names_lock = threading.Lock()
+
+    def reserve(base_name):
+        with names_lock:
+            directory = os.path.dirname(base_name) or "."
+            if directory not in listed:
+                listed.add(directory)
+                existing.update(os.path.join(os.path.dirname(base_name), os.path.splitext(name)[0])
+                                for name in os.listdir(directory) if name.endswith(('.webp', '.jpg', '.png')))
+            candidate, counter = base_name, 1
+            while candidate in reserved or (candidate in existing and not force):
+                counter += 1
+                candidate = f"{base_name}-{counter}"
+            reserved.add(candidate)
+            return candidate
+
+    def run(job, key):
+        base_name = reserve(generate_output_filename(job["prompt"], job.get("output")))
+        limiter.wait()
+        if verbose:
+            print(f"Generating image for prompt: {job['prompt']}", file=sys.stderr)
+        started = time.monotonic()
+        final_output_file = fetch_image(job["prompt"], base_name, job.get("seed"))
+        latency = time.monotonic() - started
+        manifest.add({"key": key, "prompt": job["prompt"], "output": final_output_file,
+                      "seed": job.get("seed"), "latency": round(latency, 3)})
+        return final_output_file
+
+    failed = skipped = 0
+    pending = set()
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            def drain(return_when):
+                nonlocal failed
+                done, not_done = wait(pending, return_when=return_when)
+                for future in done:
+                    try:
+                        # One output path per line, as in single-prompt mode
+                        print(future.result(), flush=True)
+                    except Exception as e:
+                        failed += 1
+                        print(f"Error: {future.prompt!r}: {e}", file=sys.stderr)
+                pending.intersection_update(not_done)
+
+            queued = set()
+            for job in read_prompts(prompt_file):
+                key = job_key(job)
+                if key in manifest or key in queued:
+                    skipped += 1
+                    continue
+                queued.add(key)
+                future = executor.submit(run, job, key)
+                future.prompt = job["prompt"]
+                pending.add(future)
+                # Keep the queue short so a huge prompt file is read lazily
+                if len(pending) >= workers * 4:
+                    drain(FIRST_COMPLETED)
+            drain(ALL_COMPLETED)
+    finally:
+        manifest.close()
+    if verbose or skipped:
+        print(f"Batch done: {skipped} already done or repeated, {failed} failed", file=sys.stderr)
+    return failed
+
 def main():
     parser = argparse.ArgumentParser(description="Generate image from text prompt using Replicate API")
     parser.add_argument("prompt", nargs="?", help="Text prompt for image generation")
     parser.add_argument("-o", "--output", help="Output filename")
     parser.add_argument("-v", "--verbose", action="store_true", help="Verbose mode")
     parser.add_argument("-f", "--force", action="store_true", help="Force overwrite existing files")
+    parser.add_argument("-b", "--batch", metavar="FILE",
+                        help="Generate an image for every prompt in FILE ('-' for stdin): one prompt per line, or JSONL "
+                             "objects with 'prompt' and optional 'output' and 'seed'")
+    parser.add_argument("-w", "--workers", type=int, default=4, help="Concurrent generations in batch mode (default: 4)")
+    parser.add_argument("-r", "--rpm", type=float, help="Limit generations started per minute in batch mode")
+    parser.add_argument("-m", "--manifest",
+                        help="Manifest of finished batch prompts, used to skip them on re-runs (default: FILE.manifest.jsonl)")
     args = parser.parse_args()
 
+    if args.batch:
+        if args.prompt or args.output:
+            parser.error("--batch takes prompts (and output names) from the file, not the command line")
+        manifest = args.manifest or ("flux_batch.manifest.jsonl" if args.batch == "-" else args.batch + ".manifest.jsonl")
+        sys.exit(1 if batch_generate(args.batch, manifest, args.workers, args.rpm, args.verbose, args.force) else 0)
+
     if not args.prompt and sys.stdin.isatty():
         parser.error("prompt is required if not piping input")
 
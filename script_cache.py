@@ -0,0 +1,13 @@
+#!/usr/bin/env python3
+
+# Location of the on-disk caches of the scripts in this repository:
+# $XDG_CACHE_HOME/handy_scripts (~/.cache/handy_scripts by default), with
+# one subdirectory or file per script. Imported by the scripts, which
+# use cache_dir() for the default of their --cache-dir options.
+
+import os
+
+
+def cache_dir(*names):
+    """Path under the shared cache directory, e.g. cache_dir("tts") -> ~/.cache/handy_scripts/tts."""
+    return os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "handy_scripts", *names)
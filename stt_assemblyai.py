@@ -1,4 +1,5 @@
 #!/usr/bin/env python
+import io
 import os
 import requests
 import time
@@ -74,6 +75,9 @@ def create_transcript(api_token, audio_url, speaker_labels):
             print(f"REST RESPONSE: {response.text}")
         raise
 
+# --format -> output file extension
+FORMAT_EXTENSIONS = {'txt': '.txt', 'srt': '.srt', 'vtt': '.vtt', 'jsonl': '.jsonl'}
+
 def write_str(args, output, string, mode='w'):
     if output != '-':
         with open(output, mode) as f:
@@ -81,20 +85,97 @@ def write_str(args, output, string, mode='w'):
     if output == '-' or not args.quiet:
         print(string)
 
+def transcript_utterances(transcript, merge=True):
+    """Utterances of a transcript as dicts with speaker, start, end (ms), text and words.
+
+    Without diarisation the whole transcript is one utterance with speaker
+    None, spanning its words or, without word timings, the whole audio.
+    With `merge`, consecutive utterances of the same speaker are joined
+    into one.
+    """
+    if not transcript.get('utterances'):
+        words = transcript.get('words') or []
+        return [{
+            'speaker': None,
+            'start': words[0]['start'] if words else 0,
+            'end': words[-1]['end'] if words else round((transcript.get('audio_duration') or 0) * 1000),
+            'text': transcript.get('text') or '',
+            'words': words,
+        }]
+    utterances = []
+    for u in transcript['utterances']:
+        if merge and utterances and utterances[-1]['speaker'] == u['speaker']:
+            last = utterances[-1]
+            last['end'] = u['end']
+            last['text'] += ' ' + u['text']
+            last['words'] += u.get('words') or []
+        else:
+            utterances.append({'speaker': u['speaker'], 'start': u['start'], 'end': u['end'],
+                               'text': u['text'], 'words': list(u.get('words') or [])})
+    return utterances
+
+def iter_cues(utterances, max_chars=80, max_ms=6000):
+    """Yield (start, end, speaker, text) subtitle cues, splitting utterances at word boundaries."""
+    for u in utterances:
+        if not u['words']:
+            yield u['start'], u['end'], u['speaker'], u['text']
+            continue
+        cue = []
+        length = 0
+        for word in u['words']:
+            if cue and (length + 1 + len(word['text']) > max_chars or word['end'] - cue[0]['start'] > max_ms):
+                yield cue[0]['start'], cue[-1]['end'], u['speaker'], ' '.join(w['text'] for w in cue)
+                cue = []
+                length = 0
+            length += len(word['text']) + (1 if cue else 0)
+            cue.append(word)
+        yield cue[0]['start'], cue[-1]['end'], u['speaker'], ' '.join(w['text'] for w in cue)
+
+def format_timestamp(ms, separator):
+    """'hh:mm:ss,mmm' (SRT) or 'hh:mm:ss.mmm' (VTT) from milliseconds."""
+    seconds, ms = divmod(int(ms), 1000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}{separator}{ms:03d}"
+
+def format_transcript(transcript, fmt='txt', merge=True):
+    """Render an AssemblyAI transcript JSON as txt, srt, vtt or speaker jsonl, in one string."""
+    utterances = transcript_utterances(transcript, merge)
+    diarised = utterances[0]['speaker'] is not None
+    if fmt in ('srt', 'vtt') and not any(u['end'] for u in utterances):
+        raise ValueError(f"the transcript has no timings (no words or audio duration), so it cannot be written as {fmt}")
+    out = io.StringIO()
+    if fmt == 'txt':
+        if diarised:
+            for u in utterances:
+                out.write(f"Speaker {u['speaker']}: {u['text']}\n")
+        else:
+            out.write(transcript['text'] + '\n')
+    elif fmt == 'jsonl':
+        for u in utterances:
+            record = {'speaker': u['speaker'], 'start': u['start'] / 1000, 'end': u['end'] / 1000, 'text': u['text']}
+            out.write(json.dumps(record, ensure_ascii=False) + '\n')
+    elif fmt == 'srt':
+        for i, (start, end, speaker, text) in enumerate(iter_cues(utterances), 1):
+            label = f"Speaker {speaker}: " if speaker is not None else ''
+            out.write(f"{i}\n{format_timestamp(start, ',')} --> {format_timestamp(end, ',')}\n{label}{text}\n\n")
+    elif fmt == 'vtt':
+        out.write('WEBVTT\n\n')
+        for start, end, speaker, text in iter_cues(utterances):
+            label = f"<v Speaker {speaker}>" if speaker is not None else ''
+            out.write(f"{format_timestamp(start, '.')} --> {format_timestamp(end, '.')}\n{label}{text}\n\n")
+    else:
+        raise ValueError(f"Unknown format: {fmt}")
+    return out.getvalue()
+
 def write_transcript_to_file(args, output, transcript, audio_input):
-    import copy
-    args_force_quiet = copy.deepcopy(args)
-    args_force_quiet.quiet = True
-    write_str(args_force_quiet, audio_input + '.assemblyai.json', json.dumps(transcript))
+    with open(audio_input + '.assemblyai.json', 'w') as f:
+        json.dump(transcript, f)
     if args.verbose and not args.quiet:
-        print(f"Server response written to {output}.response")
-    
-    if args.diarisation:
-        for utterance in transcript['utterances']:
-            chunk_str = f"Speaker {utterance['speaker']}:" + utterance['text'] + '\n'
-            write_str(args, output, chunk_str, 'a')
-    else:
-        write_str(args, output, transcript['text'] + '\n')
+        print(f"Server response written to {audio_input}.assemblyai.json")
+
+    # The whole output is rendered first and written with one call.
+    write_str(args, output, format_transcript(transcript, args.format, args.merge))
 
     if output != '-' and args.verbose and not args.quiet:
         print(f"Output written to {output}")
@@ -108,14 +189,22 @@ def stt_assemblyai_main(args, api_token):
             print("Processing audio input...")
 
         # Determine the output file
+        extension = FORMAT_EXTENSIONS[args.format]
         if args.output == '-':
-            potential_output = audio_input + '.txt'
-            output = potential_output if os.path.exists(potential_output) else '-'
+            potential_output = audio_input + extension
+            output = potential_output if os.path.exists(potential_output) and not args.from_json else '-'
         else:
-            output = args.output if args.output is not None else audio_input + '.txt'
+            output = args.output if args.output is not None else audio_input + extension
         if args.verbose:
             print(f"output filename: {output}")
-        
+
+        # Regenerate the output from the cached server response, without the API
+        if args.from_json:
+            with open(audio_input + '.assemblyai.json') as f:
+                transcript = json.load(f)
+            write_str(args, output, format_transcript(transcript, args.format, args.merge))
+            return
+
         # Check if output file exists before making the transcript
         if os.path.exists(output):
             if not args.quiet and args.verbose:
@@ -147,7 +236,10 @@ def make_arg_parser():
     parser = argparse.ArgumentParser(description='Transcribe audio file using AssemblyAI API.')
     parser.add_argument('audio_input', type=str, help='The path to the audio file or URL to transcribe.')
     parser.add_argument('-d', '--diarisation', action='store_true', help='Enable speaker diarisation. This will label each speaker in the transcription.')
-    parser.add_argument('-o', '--output', type=str, default=None, help='The path to the output file to store the result. If not provided, the result will be saved to a file with the same name as the input file but with a .txt extension. If "-" is provided, the result will be printed only to standard output and no files saved.')
+    parser.add_argument('-f', '--format', choices=list(FORMAT_EXTENSIONS), default='txt', help='Output format: plain text (default), SRT or WebVTT subtitles, or JSONL with one speaker turn (speaker, start, end, text) per line.')
+    parser.add_argument('-j', '--from-json', action='store_true', help='Regenerate the output from the cached <audio_input>.assemblyai.json of an earlier run instead of calling the API, overwriting an existing output file.')
+    parser.add_argument('--no-merge', action='store_false', dest='merge', help='Keep consecutive utterances of the same speaker separate instead of merging them into one turn.')
+    parser.add_argument('-o', '--output', type=str, default=None, help='The path to the output file to store the result. If not provided, the result will be saved to a file with the same name as the input file with the extension of --format (.txt by default) appended. If "-" is provided, the result will be printed only to standard output and no files saved.')
     parser.add_argument('-q', '--quiet', action='store_true', help='Suppress all status messages to standard output. If an output file is specified, the result will still be saved to that file (or standard output if `-` is specified).')
     parser.add_argument('-e', '--expected-speakers', type=int, default=-1, help='The expected number of speakers for diarisation. This helps improve the accuracy of speaker labelling.')
     parser.add_argument('-l', '--language', type=str, default='auto', help='The dominant language in the audio file. Example codes: en, en_au, en_uk, en_us, es, fr, de, it, pt, nl, hi, ja, zh, fi, ko, pl, ru. Default is "auto" for automatic language detection.')
@@ -155,11 +247,13 @@ def make_arg_parser():
     return parser
 
 if __name__ == "__main__":
+    parser = make_arg_parser()
+    args = parser.parse_args()
     try:
         api_token = os.environ["ASSEMBLYAI_API_KEY"]
     except KeyError:
-        print("Error: ASSEMBLYAI_API_KEY environment variable not set.")
-        sys.exit(1)
-    parser = make_arg_parser()
-    args = parser.parse_args()
+        if not args.from_json:
+            print("Error: ASSEMBLYAI_API_KEY environment variable not set.")
+            sys.exit(1)
+        api_token = None
     stt_assemblyai_main(args, api_token)
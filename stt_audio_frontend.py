@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+
+# Shared audio helpers for the recording CLIs next to this file
+# (openai_stt_cli.py and stt_openai_OR_local_whisper_cli.py).
+#
+# Recorded audio stays in memory and is encoded straight into a BytesIO
+# for upload; the disk is only touched when the user asks to keep a copy.
+#
+# The audio callback only meters the block and copies it into a
+# preallocated lock-free ring. A drain thread moves the audio into the
+# recording buffer and runs an energy VAD on it, which drives auto-stop on
+# silence and trimming of leading/trailing silence before upload.
+
+import io
+import math
+import select
+import sys
+import threading
+import numpy as np
+
+try:
+    import soundfile as sf
+except (OSError, ModuleNotFoundError):
+    sf = None
+
+# --format choice -> (soundfile container, subtype)
+AUDIO_FORMATS = {
+    "wav": ("WAV", "PCM_16"),
+    "flac": ("FLAC", "PCM_16"),
+    "ogg": ("OGG", "OPUS"),
+}
+
+
+def block_rms(block):
+    """RMS of one audio block without allocating a squared temporary."""
+    x = block.reshape(-1)
+    if not len(x):
+        return 0.0
+    return math.sqrt(float(np.dot(x, x)) / len(x))
+
+
+def frame_rms(samples, frame):
+    """RMS of each complete `frame`-sized chunk of samples, vectorised."""
+    n = len(samples) // frame
+    x = samples[:n * frame].reshape(n, frame)
+    return np.sqrt(np.einsum("ij,ij->i", x, x) / frame)
+
+
+class RingBuffer:
+    """Fixed-size single-producer/single-consumer ring of audio frames.
+
+    The audio callback writes and one drain thread reads. Each side only
+    advances its own monotonic frame counter, so no lock is needed and
+    write() never allocates audio memory. If the reader falls more than
+    `capacity` frames behind, incoming blocks are dropped and counted in
+    `overruns` rather than blocking the audio thread.
+    """
+
+    def __init__(self, capacity, channels=1):
+        self.capacity = capacity
+        self._data = np.zeros((capacity, channels), dtype=np.float32)
+        self._written = 0
+        self._read = 0
+        self.overruns = 0
+
+    def __len__(self):
+        return self._written - self._read
+
+    def write(self, block):
+        n = len(block)
+        if n > self.capacity - (self._written - self._read):
+            self.overruns += 1
+            return False
+        start = self._written % self.capacity
+        first = min(n, self.capacity - start)
+        self._data[start:start + first] = block[:first]
+        if first < n:
+            self._data[:n - first] = block[first:]
+        self._written += n
+        return True
+
+    def read_into(self, sink):
+        """Append all available frames to `sink` and return their count."""
+        written = self._written
+        n = written - self._read
+        if n:
+            start = self._read % self.capacity
+            first = min(n, self.capacity - start)
+            sink.append(self._data[start:start + first])
+            if first < n:
+                sink.append(self._data[:n - first])
+            self._read = written
+        return n
+
+
+class AudioBuffer:
+    """Preallocated float32 buffer that recorded blocks are appended to.
+
+    The backing array starts with room for `initial_seconds` of audio and
+    doubles when full, so a recording costs a handful of reallocations
+    instead of one queued copy per block.
+
+    It is written from one thread only (the front end's drain thread).
+    Readers look at frames below `len(buffer)`, which is published after
+    the data is in place, so no lock is needed.
+    """
+
+    def __init__(self, sample_rate, channels=1, initial_seconds=60):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self._data = np.zeros((int(sample_rate * initial_seconds), channels), dtype=np.float32)
+        self._frames = 0
+
+    def __len__(self):
+        return self._frames
+
+    def append(self, block):
+        end = self._frames + len(block)
+        if end > len(self._data):
+            grown = np.empty((max(end, 2 * len(self._data)), self.channels), dtype=np.float32)
+            grown[:self._frames] = self._data[:self._frames]
+            self._data = grown
+        self._data[self._frames:end] = block
+        self._frames = end
+
+    def view(self, start=0, end=None):
+        """Return frames [start, end) as a view, without copying."""
+        # Read the frame count before the array: a concurrent append() may
+        # swap in a grown array, which always holds at least that many frames.
+        if end is None:
+            end = self._frames
+        return self._data[start:end]
+
+    def duration(self):
+        return self._frames / self.sample_rate
+
+
+class EnergyVAD:
+    """Energy-based voice activity detector in the spirit of WebRTC's VAD.
+
+    Works on fixed frames (30ms by default). A frame is loud when its RMS is
+    `ratio` times above an adaptive noise floor and above `min_rms`. Speech
+    starts after `onset_ms` of consecutive loud frames and is held for
+    `hangover_ms` after the level drops. The noise floor follows quiet
+    frames quickly and loud ones slowly, so it settles on the room noise.
+    """
+
+    def __init__(self, sample_rate, frame_ms=30, ratio=3.0, min_rms=0.005, onset_ms=90, hangover_ms=300):
+        self.sample_rate = sample_rate
+        self.frame = int(sample_rate * frame_ms / 1000)
+        self.ratio = ratio
+        self.min_rms = min_rms
+        self.onset_frames = max(1, onset_ms // frame_ms)
+        self.hangover_frames = max(1, hangover_ms // frame_ms)
+        self.noise = min_rms
+        self.speech = False
+        self.loud_run = 0
+        self.quiet_run = 0
+        self.pos = 0
+        # Sample offsets of the first speech onset and the end of the last loud frame.
+        self.first_speech = None
+        self.last_speech = None
+        # Finished (onset, end) sample ranges of speech, and the onset of the current one.
+        self.speech_runs = []
+        self.run_start = None
+
+    def process(self, rms):
+        """Feed the RMS of the next frame; returns True while in speech."""
+        loud = rms > max(self.min_rms, self.noise * self.ratio)
+        self.noise += (0.5 if rms < self.noise else 0.002) * (rms - self.noise)
+        if loud:
+            self.loud_run += 1
+            self.quiet_run = 0
+            if not self.speech and self.loud_run >= self.onset_frames:
+                self.speech = True
+                self.run_start = self.pos - (self.loud_run - 1) * self.frame
+                if self.first_speech is None:
+                    self.first_speech = self.run_start
+            if self.speech:
+                self.last_speech = self.pos + self.frame
+        else:
+            self.loud_run = 0
+            self.quiet_run += 1
+            if self.speech and self.quiet_run > self.hangover_frames:
+                self.speech_runs.append((self.run_start, self.last_speech))
+                self.speech = False
+        self.pos += self.frame
+        return self.speech
+
+    def silence_after_speech(self):
+        """Seconds since speech ended, or 0 if no speech was heard yet."""
+        if self.last_speech is None or self.speech:
+            return 0.0
+        return (self.pos - self.last_speech) / self.sample_rate
+
+
+class AudioFrontEnd:
+    """Audio callback, level meter, recording buffer and VAD in one place.
+
+    Pass `callback` to sounddevice.InputStream and call start()/stop()
+    around the stream. `pct` is the 0..1 level shown in the prompt bar and
+    `auto_stopped` is set once `auto_stop` seconds of silence follow speech.
+    """
+
+    def __init__(self, sample_rate, channels=1, ring_seconds=10, auto_stop=None, vad=None):
+        self.sample_rate = sample_rate
+        self.ring = RingBuffer(int(sample_rate * ring_seconds), channels)
+        self.buffer = AudioBuffer(sample_rate, channels)
+        self.vad = vad if vad is not None else EnergyVAD(sample_rate)
+        self.auto_stop = auto_stop
+        self.auto_stopped = threading.Event()
+        self.max_rms = 0
+        self.min_rms = 1e5
+        self.pct = 0
+        self._vad_pos = 0
+        self._stop = threading.Event()
+        self._drainer = None
+
+    def callback(self, indata, frames, time, status):
+        """This is called (from a separate thread) for each audio block."""
+        rms = block_rms(indata)
+        self.max_rms = max(self.max_rms, rms)
+        self.min_rms = min(self.min_rms, rms)
+
+        rng = self.max_rms - self.min_rms
+        if rng > 0.001:
+            self.pct = (rms - self.min_rms) / rng
+        else:
+            self.pct = 0.5
+
+        self.ring.write(indata)
+
+    def start(self):
+        self._stop.clear()
+        self._drainer = threading.Thread(target=self._drain_loop, daemon=True)
+        self._drainer.start()
+
+    def stop(self):
+        """Stop the drain thread and move the last frames into the buffer."""
+        self._stop.set()
+        if self._drainer is not None:
+            self._drainer.join()
+        self.drain()
+
+    def _drain_loop(self):
+        while not self._stop.wait(0.02):
+            self.drain()
+
+    def drain(self):
+        """Move frames from the ring into the buffer and run the VAD on them."""
+        self.ring.read_into(self.buffer)
+        step = self.vad.frame
+        levels = frame_rms(self.buffer.view(self._vad_pos, len(self.buffer))[:, 0], step)
+        for rms in levels:
+            self.vad.process(rms)
+        self._vad_pos += len(levels) * step
+        if self.auto_stop and self.vad.silence_after_speech() >= self.auto_stop:
+            self.auto_stopped.set()
+
+    def speech_view(self, pad=0.3):
+        """The recording without leading/trailing silence, as a view.
+
+        Falls back to the whole recording when the VAD heard no speech, so
+        quiet speech is never thrown away.
+        """
+        if self.vad.first_speech is None:
+            return self.buffer.view()
+        pad_frames = int(pad * self.sample_rate)
+        start = max(0, self.vad.first_speech - pad_frames)
+        end = min(len(self.buffer), self.vad.last_speech + pad_frames)
+        return self.buffer.view(start, end)
+
+
+def wait_for_enter(stop_event):
+    """Read a line from stdin, returning "" early once stop_event is set."""
+    while not stop_event.is_set():
+        ready, _, _ = select.select([sys.stdin], [], [], 0.1)
+        if ready:
+            return sys.stdin.readline().rstrip("\n")
+    return ""
+
+
+def encode_audio(samples, sample_rate, fmt="wav"):
+    """Encode samples into an in-memory file object ready for upload."""
+    container, subtype = AUDIO_FORMATS[fmt]
+    buf = io.BytesIO()
+    sf.write(buf, samples, sample_rate, format=container, subtype=subtype)
+    buf.seek(0)
+    # Upload clients take the file type from the name.
+    buf.name = f"audio.{fmt}"
+    return buf
+
+
+def save_audio(samples, sample_rate, path, fmt=None):
+    """Write samples to `path`; the format defaults to the file extension."""
+    if fmt is None:
+        sf.write(path, samples, sample_rate)
+    else:
+        container, subtype = AUDIO_FORMATS[fmt]
+        sf.write(path, samples, sample_rate, format=container, subtype=subtype)
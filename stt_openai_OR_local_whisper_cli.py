@@ -1,25 +1,58 @@
 #!/usr/bin/env python3
 import os
 import sys
-import queue
 import tempfile
 import time
 import argparse
+import json
+import queue
+import re
+import signal
 import shutil
+import statistics
 import subprocess
+import threading
+import httpx
 import numpy as np
 from functools import partial
 from openai import OpenAI
+from script_cache import cache_dir
+from stt_audio_frontend import AUDIO_FORMATS, AudioFrontEnd, encode_audio, save_audio, wait_for_enter
 
 eprint = partial(print, file=sys.stderr)
 
+SAMPLE_RATE = 16000  # 16kHz
+WHISPER_CPP_MODEL = "/usr/share/whisper.cpp-model-large/large.bin"
+CACHE_DIR = cache_dir()
+LATENCY_HISTORY = os.path.join(CACHE_DIR, "stt_latency_history.json")
+
+# Menu option -> backend name used in the latency history
+BACKENDS = {
+    '1': 'openai',
+    '2': 'whisper.cpp --speed-up',
+    '3': 'whisper.cpp',
+    '4': 'whisper.cpp server',
+}
+RACE_CHOICE = '5'
+
 # Argument parsing
 parser = argparse.ArgumentParser(description='OpenAI STT/ASR CLI (Voice to Text)')
-parser.add_argument('-s', '--silent', action='store_true', help='Run in silent mode without prompt')
+parser.add_argument('-s', '--silent', action='store_true', help='Run in silent mode without prompt, using the default backend (the fastest one so far)')
 parser.add_argument('-o', '--output', type=str, help='Specify output file for transcript')
 parser.add_argument('-a', '--append', type=str, help='Specify output file to append transcript')
 parser.add_argument('-c', '--clipboard', action='store_true', help='Copy result to clipboard using xclip')
+parser.add_argument('-k', '--keep', type=str, help='Also save the recording to this audio file')
+parser.add_argument('-A', '--auto-stop', type=float, metavar='SECONDS', help='Stop recording after this many seconds of silence following speech')
+parser.add_argument('--no-trim', action='store_true', help='Upload the whole recording instead of trimming leading/trailing silence')
+parser.add_argument('-f', '--format', choices=sorted(AUDIO_FORMATS), default='wav', help='Audio format used for upload to the OpenAI API (default: wav)')
 parser.add_argument('-x', '--non-interactive', action='store_true', help='Do not prompt user, i.e. use in pipelines (WIP).')
+parser.add_argument('--whisper-model', type=str, default=WHISPER_CPP_MODEL, help=f'whisper.cpp model file (default: {WHISPER_CPP_MODEL})')
+parser.add_argument('--whisper-server-bin', type=str, default=os.getenv('WHISPER_SERVER_BIN', 'whisper-server'), help='whisper.cpp server binary for option 4 (default: $WHISPER_SERVER_BIN or whisper-server)')
+parser.add_argument('--whisper-server-port', type=int, default=8178, help='Local port of the whisper.cpp server (default: 8178)')
+parser.add_argument('--race-local', choices=['cli', 'server'], default='cli', help='Local contender for option 5 (race): whisper.cpp CLI (killed when it loses) or the whisper.cpp server (default: cli)')
+parser.add_argument('--stop-whisper-server', action='store_true', help='Stop the background whisper.cpp server and exit')
+parser.add_argument('--benchmark', type=str, metavar='WAV', help='Compare cold (CLI) and warm (server) whisper.cpp latency on a 16kHz WAV file and exit')
+parser.add_argument('--benchmark-runs', type=int, default=3, help='Number of warm server runs in --benchmark (default: 3)')
 args = parser.parse_args()
 
 client = OpenAI()
@@ -30,6 +63,7 @@ except (OSError, ModuleNotFoundError):
     sf = None
 
 from prompt_toolkit import PromptSession
+from prompt_toolkit.application import get_app
 from prompt_toolkit.output import create_output
 
 # Create an output object that writes to standard error
@@ -39,25 +73,211 @@ stderr_output = create_output(sys.stderr)
 session = PromptSession(output=stderr_output)
 
 def display_menu(array_of_options=False):
-    options = ['1', '2', '3', '']
+    options = ['1', '2', '3', '4', '5', '']
     if array_of_options:
         return options
+    default = default_choice()
+    labels = {
+        '1': "transcript with openai API",
+        '2': "transcript locally with whisper.cpp (with `--speed-up`)",
+        '3': "transcript locally with whisper.cpp",
+        '4': "transcript locally with whisper.cpp server (model stays loaded between runs)",
+        '5': "race openai API against local whisper.cpp, take whichever finishes first",
+    }
     eprint("Recording. Press option and ENTER (or just ENTER for default):")
-    eprint("1. transcript with openai API (default)")
-    eprint("2. transcript locally with whisper.cpp (with `--speed-up`)")
-    eprint("3. transcript locally with whisper.cpp")
-    eprint("4. TODO")
+    for option, label in labels.items():
+        eprint(f"{option}. {label}" + (" (default)" if option == default else ""))
+
+
+latency_lock = threading.Lock()
+
+
+def load_latency_history():
+    try:
+        with open(LATENCY_HISTORY) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def record_latency(backend, seconds, audio_seconds, keep=20):
+    """Remember how long `backend` took, as seconds per second of audio."""
+    if audio_seconds <= 0:
+        return
+    with latency_lock:
+        history = load_latency_history()
+        runs = history.setdefault(backend, [])
+        runs.append(round(seconds / audio_seconds, 4))
+        del runs[:-keep]
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp = LATENCY_HISTORY + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(history, f)
+        os.replace(tmp, LATENCY_HISTORY)
+
+
+def default_choice():
+    """Menu option of the backend with the best median latency so far (openai without history)."""
+    history = load_latency_history()
+    timed = {option: statistics.median(history[name]) for option, name in BACKENDS.items() if history.get(name)}
+    return min(timed, key=timed.get) if timed else '1'
+
+
+def parse_time_elapsed(time_output):
+    """Wall-clock seconds from GNU time output ("... 1:02.34elapsed ..."), or None."""
+    match = re.search(r'(?:(\d+):)?(\d+):(\d+(?:\.\d+)?)elapsed', time_output)
+    if not match:
+        return None
+    hours, minutes, seconds = match.groups()
+    return int(hours or 0) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def process_alive(pid):
+    """True while `pid` runs; reaps it if it is our exited child, and treats zombies as dead."""
+    try:
+        if os.waitpid(pid, os.WNOHANG)[0] == pid:
+            return False
+    except ChildProcessError:
+        pass
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except OSError:
+        return False
+
+
+class TranscriptionCancelled(Exception):
+    pass
 
 
 class SoundDeviceError(Exception):
     pass
 
 
-class Voice:
-    max_rms = 0
-    min_rms = 1e5
-    pct = 0
+class WhisperServerError(Exception):
+    pass
+
+
+class WhisperCppServer:
+    """Long-lived whisper.cpp server that keeps the model loaded across runs.
+
+    The server is started detached on first use and its pid, port and model
+    are recorded in a state file, so later invocations of this script reuse
+    the already loaded model instead of reading it from disk again. Each
+    transcription is preceded by a health check; a dead, hung or mismatched
+    server is killed and restarted automatically.
+    """
+
+    def __init__(self, binary, model, port, host="127.0.0.1", startup_timeout=300):
+        self.binary = binary
+        self.model = model
+        self.host = host
+        self.port = port
+        self.startup_timeout = startup_timeout
+        self.state_file = os.path.join(CACHE_DIR, f"whisper_server_{port}.json")
+        self.log_file = os.path.join(CACHE_DIR, f"whisper_server_{port}.log")
+
+    def url(self, path):
+        return f"http://{self.host}:{self.port}{path}"
+
+    def read_state(self):
+        try:
+            with open(self.state_file) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def healthy(self):
+        """True if a server with our model answers on our port."""
+        if self.read_state().get("model") != self.model:
+            return False
+        try:
+            response = httpx.get(self.url("/health"), timeout=2)
+            if response.status_code == 404:
+                # Older whisper.cpp servers have no /health; their index page will do.
+                response = httpx.get(self.url("/"), timeout=2)
+            return response.status_code == 200
+        except httpx.HTTPError:
+            return False
+
+    def stop(self):
+        pid = self.read_state().get("pid")
+        if pid:
+            try:
+                with open(f"/proc/{pid}/cmdline", "rb") as f:
+                    ours = os.path.basename(self.binary).encode() in f.read()
+            except OSError:
+                ours = False
+            if ours:
+                eprint(f"Stopping whisper.cpp server (pid {pid})")
+                self.terminate(pid)
+        if os.path.exists(self.state_file):
+            os.remove(self.state_file)
+
+    def terminate(self, pid, timeout=10):
+        """SIGTERM the server and wait for it to exit, falling back to SIGKILL after `timeout` seconds.
+
+        Waiting matters because the replacement binds the same port, and a
+        dying server may still answer its health check.
+        """
+        for sig, wait in ((signal.SIGTERM, timeout), (signal.SIGKILL, 5)):
+            try:
+                os.kill(pid, sig)
+            except ProcessLookupError:
+                return
+            deadline = time.time() + wait
+            while time.time() < deadline:
+                if not process_alive(pid):
+                    return
+                time.sleep(0.1)
+            if sig == signal.SIGTERM:
+                eprint(f"whisper.cpp server (pid {pid}) ignored SIGTERM for {timeout}s, killing it")
+        raise WhisperServerError(f"whisper.cpp server (pid {pid}) did not exit")
+
+    def start(self):
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        command = [self.binary, "--model", self.model, "--host", self.host, "--port", str(self.port)]
+        eprint(f"Starting whisper.cpp server: {' '.join(command)}")
+        with open(self.log_file, "ab") as log:
+            process = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=log, stderr=log,
+                                       start_new_session=True)
+        with open(self.state_file, "w") as f:
+            json.dump({"pid": process.pid, "port": self.port, "model": self.model}, f)
+
+        deadline = time.time() + self.startup_timeout
+        while time.time() < deadline:
+            if process.poll() is not None:
+                raise WhisperServerError(f"whisper.cpp server exited with {process.returncode}, see {self.log_file}")
+            if self.healthy():
+                return
+            time.sleep(0.25)
+        self.stop()
+        raise WhisperServerError(f"whisper.cpp server did not become healthy within {self.startup_timeout}s")
+
+    def ensure_running(self):
+        if not self.healthy():
+            self.stop()
+            self.start()
+
+    def transcribe(self, audio, sample_rate=SAMPLE_RATE, retries=1):
+        audio_file = encode_audio(audio, sample_rate, "wav")
+        for attempt in range(retries + 1):
+            self.ensure_running()
+            try:
+                response = httpx.post(self.url("/inference"), timeout=None,
+                                      files={"file": ("recording.wav", audio_file, "audio/wav")},
+                                      data={"response_format": "text", "temperature": "0.0"})
+                response.raise_for_status()
+                return response.text
+            except httpx.HTTPError as e:
+                if attempt == retries:
+                    raise WhisperServerError(f"whisper.cpp server request failed: {e}")
+                eprint(f"whisper.cpp server request failed ({e}), restarting server")
+                self.stop()
+                audio_file.seek(0)
+
 
+class Voice:
     threshold = 0.15
 
     def __init__(self):
@@ -73,26 +293,18 @@ class Voice:
             eprint(f"An error occurred while initializing the sound device: {e}")
             raise SoundDeviceError("Failed to initialize the sound device.")
 
-    def callback(self, indata, frames, time, status):
-        """This is called (from a separate thread) for each audio block."""
-        rms = np.sqrt(np.mean(indata**2))
-        self.max_rms = max(self.max_rms, rms)
-        self.min_rms = min(self.min_rms, rms)
-
-        rng = self.max_rms - self.min_rms
-        if rng > 0.001:
-            self.pct = (rms - self.min_rms) / rng
-        else:
-            self.pct = 0.5
-
-        self.q.put(indata.copy())
-
     def get_prompt(self):
+        if self.frontend.auto_stopped.is_set():
+            app = get_app()
+            if not app.is_done:
+                app.exit(result="")
+
         num = 10
-        if np.isnan(self.pct) or self.pct < self.threshold:
+        pct = self.frontend.pct
+        if np.isnan(pct) or pct < self.threshold:
             cnt = 0
         else:
-            cnt = int(self.pct * 10)
+            cnt = int(pct * 10)
 
         #bar = "░" * cnt + "█" * (num - cnt)
         bar = "#" * cnt + "_" * (num - cnt)
@@ -106,59 +318,169 @@ class Voice:
     # from the function without proceeding to the transcription step.
 
     def raw_record_only(self):
-        self.q = queue.Queue()
-
-        filename = tempfile.mktemp(suffix=".wav")
-
-        sample_rate = 16000  # 16kHz
+        sample_rate = SAMPLE_RATE
+        self.frontend = AudioFrontEnd(sample_rate, auto_stop=args.auto_stop)
+        self.buffer = self.frontend.buffer
 
         self.start_time = time.time()
 
-        with self.sd.InputStream(samplerate=sample_rate, channels=1, callback=self.callback):
-            if not args.silent:
-                choice = session.prompt(self.get_prompt, refresh_interval=0.1)
-            else:
-                choice = input("") # silently wait for ENTER in silent mode.
-
-        # Only proceed with transcription if there are audio frames in the queue
-        if not self.q.empty():
-            with sf.SoundFile(filename, mode="x", samplerate=sample_rate, channels=1) as file:
-                while not self.q.empty():
-                    file.write(self.q.get())
+        self.frontend.start()
+        try:
+            with self.sd.InputStream(samplerate=sample_rate, channels=1, callback=self.frontend.callback):
+                if not args.silent:
+                    choice = session.prompt(self.get_prompt, refresh_interval=0.1)
+                elif args.auto_stop:
+                    choice = wait_for_enter(self.frontend.auto_stopped)
+                else:
+                    choice = input("") # silently wait for ENTER in silent mode.
+        finally:
+            self.frontend.stop()
+
+        # Only proceed with transcription if there are audio frames in the buffer
+        if len(self.buffer):
+            if args.keep:
+                save_audio(self.buffer.view(), sample_rate, args.keep)
         else:
             eprint("No audio recorded.")
 
-        return choice, filename
+        audio = self.buffer.view() if args.no_trim else self.frontend.speech_view()
+        return choice, audio
 
-    def transcribe_with_openai_api(self, filename):
-        with open(filename, "rb") as fh:
-            transcript = client.audio.transcriptions.create(model="whisper-1", file=fh)
+    def transcribe_with_openai_api(self, audio, record=True):
+        start = time.time()
+        audio_file = encode_audio(audio, SAMPLE_RATE, args.format)
+        transcript = client.audio.transcriptions.create(model="whisper-1", file=audio_file)
         transcript_text = transcript.text
+        if record:
+            record_latency(BACKENDS['1'], time.time() - start, len(audio) / SAMPLE_RATE)
+
+        return transcript_text
 
+    def run_whisper_cpp_in_temp_dir(self, audio, extra_flags=[], cancel=None, record=True):
+        """Run whisper.cpp on audio; kills it and raises TranscriptionCancelled once `cancel` is set."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            base = "recording"
+            temp_filename = os.path.join(temp_dir, f"{base}.wav")
+            # whisper.cpp reads from disk, so the WAV is written once, straight into its working dir.
+            save_audio(audio, SAMPLE_RATE, temp_filename, fmt="wav")
+            eprint(f"Processing {temp_filename} with whisper.cpp in {temp_dir}")
+            eprint(f"Base filename: {base}")
+            command = ["/usr/bin/time", f"--output={base}.wav.time", "whisper.cpp", "--model", args.whisper_model] + extra_flags + ["-otxt", "-ovtt", "-osrt", "-ocsv", temp_filename]
+            eprint(f"Running command: {' '.join(command)}")
+            process = subprocess.Popen(command, cwd=temp_dir, start_new_session=True)
+            while True:
+                try:
+                    process.wait(timeout=0.1)
+                    break
+                except subprocess.TimeoutExpired:
+                    if cancel is not None and cancel.is_set():
+                        # Kill the whole session: /usr/bin/time and whisper.cpp under it.
+                        os.killpg(process.pid, signal.SIGKILL)
+                        process.wait()
+                        raise TranscriptionCancelled("whisper.cpp")
+            eprint(f"Command result: {process.returncode}")
+            with open(f"{temp_dir}/{base}.wav.time", 'r') as f:
+                time_output = f.read()
+                # stderr: stdout only carries the transcript
+                eprint(time_output)
+            with open(f"{temp_dir}/{base}.wav.txt", 'r') as f:
+                transcript_text = f.read()
+        elapsed = parse_time_elapsed(time_output)
+        if record and elapsed is not None:
+            backend = BACKENDS['2'] if "--speed-up" in extra_flags else BACKENDS['3']
+            record_latency(backend, elapsed, len(audio) / SAMPLE_RATE)
         return transcript_text
 
-    def run_whisper_cpp_in_temp_dir(self, filename, extra_flags=[]):
+    def transcribe_with_whisper_cpp(self, audio, extra_flags=[], cancel=None, record=True):
+        return self.run_whisper_cpp_in_temp_dir(audio, extra_flags, cancel, record)
+
+    def transcribe_with_whisper_server(self, audio, record=True):
+        start = time.time()
+        transcript_text = whisper_server().transcribe(audio)
+        if record:
+            record_latency(BACKENDS['4'], time.time() - start, len(audio) / SAMPLE_RATE)
+        return transcript_text
+
+    def transcribe_race(self, audio):
+        """Start OpenAI API and local whisper.cpp at once and return the first transcript.
+
+        The loser is abandoned: a local whisper.cpp CLI run is killed, an
+        OpenAI (or server) request is left to a daemon thread that dies with
+        the process. The race records the latency of both: the winner's
+        time, and the time the loser had run so far as a lower bound, so
+        the history also learns when a backend gets slower. Failed
+        contenders are not recorded.
+        """
+        cancel = threading.Event()
+        results = queue.Queue()
+        if args.race_local == 'server':
+            local = (BACKENDS['4'], partial(self.transcribe_with_whisper_server, audio, record=False))
+        else:
+            local = (BACKENDS['3'], partial(self.transcribe_with_whisper_cpp, audio, cancel=cancel, record=False))
+        contenders = [(BACKENDS['1'], partial(self.transcribe_with_openai_api, audio, record=False)), local]
+        audio_seconds = len(audio) / SAMPLE_RATE
+        start = time.time()
+
+        def run(name, transcribe):
+            try:
+                results.put((name, transcribe(), None))
+            except Exception as e:
+                results.put((name, None, e))
+
+        for name, transcribe in contenders:
+            threading.Thread(target=run, args=(name, transcribe), daemon=True).start()
+
+        errors = []
+        failed = set()
         try:
-            with tempfile.TemporaryDirectory() as temp_dir:
-                base = os.path.splitext(os.path.basename(filename))[0]
-                temp_filename = os.path.join(temp_dir, f"{base}.wav")
-                shutil.copyfile(filename, temp_filename)
-                eprint(f"Processing {temp_filename} with whisper.cpp in {temp_dir}")
-                eprint(f"Base filename: {base}")
-                command = ["/usr/bin/time", f"--output={base}.wav.time", "whisper.cpp", "--model", "/usr/share/whisper.cpp-model-large/large.bin"] + extra_flags + ["-otxt", "-ovtt", "-osrt", "-ocsv", temp_filename]
-                eprint(f"Running command: {' '.join(command)}")
-                result = subprocess.run(command, cwd=temp_dir)
-                eprint(f"Command result: {result}")
-                with open(f"{temp_dir}/{base}.wav.time", 'r') as f:
-                    print(f.read())
-                with open(f"{temp_dir}/{base}.wav.txt", 'r') as f:
-                    transcript_text = f.read()
+            for _ in contenders:
+                name, transcript_text, error = results.get()
+                if error is None:
+                    elapsed = time.time() - start
+                    eprint(f"Race won by {name}")
+                    for contender, _ in contenders:
+                        if contender not in failed:
+                            record_latency(contender, elapsed, audio_seconds)
+                    return transcript_text
+                eprint(f"{name} failed: {error}")
+                failed.add(name)
+                errors.append(error)
         finally:
-            shutil.rmtree(temp_dir, ignore_errors=True)
-        return transcript_text
+            cancel.set()
+        raise errors[-1]
+
+
+def whisper_server():
+    return WhisperCppServer(args.whisper_server_bin, args.whisper_model, args.whisper_server_port)
 
-    def transcribe_with_whisper_cpp(self, filename, extra_flags=[]):
-        return self.run_whisper_cpp_in_temp_dir(filename, extra_flags)
+
+def benchmark_whisper(voice, wav_path, runs):
+    """Print cold (CLI, model loaded per call) vs warm (server) whisper.cpp latency."""
+    audio, sample_rate = sf.read(wav_path, dtype="float32", always_2d=True)
+    if sample_rate != SAMPLE_RATE:
+        raise ValueError(f"{wav_path} is {sample_rate}Hz, whisper.cpp needs {SAMPLE_RATE}Hz audio")
+    server = whisper_server()
+
+    # Benchmark runs are kept out of the latency history that picks the default backend.
+    start = time.time()
+    voice.transcribe_with_whisper_cpp(audio, record=False)
+    cold_cli = time.time() - start
+
+    server.stop()
+    start = time.time()
+    server.transcribe(audio)
+    cold_server = time.time() - start
+
+    warm = []
+    for _ in range(runs):
+        start = time.time()
+        server.transcribe(audio)
+        warm.append(time.time() - start)
+
+    eprint(f"Audio length:                          {len(audio) / sample_rate:.1f}s")
+    eprint(f"whisper.cpp CLI (cold, loads model):   {cold_cli:.2f}s")
+    eprint(f"server first call (start + load):      {cold_server:.2f}s")
+    eprint(f"server warm (median of {runs}):           {statistics.median(warm):.2f}s")
 
 def wait_for_user(transcript, arg_should_not_wait=False):
     if arg_should_not_wait:
@@ -172,12 +494,17 @@ if __name__ == "__main__":
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
         raise ValueError("Please set the OPENAI_API_KEY environment variable.")
+    if args.stop_whisper_server:
+        whisper_server().stop()
+        exit(0)
+    if args.benchmark:
+        benchmark_whisper(Voice(), args.benchmark, args.benchmark_runs)
+        exit(0)
     try:
         if not args.silent:
             display_menu()
         voice = Voice()
-        choice, filename = voice.raw_record_only()
-        transcript = voice.transcribe_with_openai_api(filename)
+        choice, audio = voice.raw_record_only()
     except KeyboardInterrupt:
         eprint("\nRecording interrupted by user.")
         exit(0)
@@ -186,16 +513,22 @@ if __name__ == "__main__":
             eprint("Invalid choice. Please try again.")
             display_menu()
             choice = input("Enter your choice: ")
+        if choice == '':
+            choice = default_choice()
     else:
-        choice = '1'  # Default to OpenAI API in silent mode
+        choice = default_choice()  # Fastest backend so far (OpenAI API without history)
     if choice == '1':
-        transcript = voice.transcribe_with_openai_api(filename)
+        transcript = voice.transcribe_with_openai_api(audio)
     elif choice == '2':
-        transcript = voice.transcribe_with_whisper_cpp(filename, extra_flags=["--speed-up"])
-        wait_for_user(transcript, args.non_interactive)
+        transcript = voice.transcribe_with_whisper_cpp(audio, extra_flags=["--speed-up"])
+        wait_for_user(transcript, args.non_interactive or args.silent)
     elif choice == '3':
-        transcript = voice.transcribe_with_whisper_cpp(filename, extra_flags=[])
-        wait_for_user(transcript, args.non_interactive)
+        transcript = voice.transcribe_with_whisper_cpp(audio, extra_flags=[])
+        wait_for_user(transcript, args.non_interactive or args.silent)
+    elif choice == '4':
+        transcript = voice.transcribe_with_whisper_server(audio)
+    elif choice == RACE_CHOICE:
+        transcript = voice.transcribe_race(audio)
     if args.clipboard:
         if shutil.which('xclip'):
             transcript_trimmed = transcript.strip()
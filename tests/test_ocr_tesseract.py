@@ -0,0 +1,109 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+pytest.importorskip("cv2")
+pytest.importorskip("pytesseract")
+pa = pytest.importorskip("pyarrow")
+
+import ocr_tesseract  # noqa: E402
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def page_boxes(words):
+    data = {name: [] for name in ocr_tesseract.BOX_DTYPE.names}
+    for i, word in enumerate(words):
+        for name in data:
+            data[name].append(word if name == "text" else i)
+    return ocr_tesseract.word_boxes(data)
+
+
+def read_table(path):
+    if path.endswith(".parquet"):
+        import pyarrow.parquet
+        return pyarrow.parquet.read_table(path)
+    with pa.ipc.open_file(path) as reader:
+        return reader.read_all()
+
+
+@pytest.mark.parametrize("ext", [".parquet", ".arrow"])
+@pytest.mark.parametrize("blank", [0, 1, 2])
+def test_columnar_writer_blank_page(tmp_path, ext, blank):
+    pages = [["hello", "world"], ["second"], ["third", "page"]]
+    pages[blank] = []
+    path = str(tmp_path / ("boxes" + ext))
+    writer = ocr_tesseract.ColumnarWriter(path)
+    for page, words in enumerate(pages, 1):
+        writer.write(page_boxes(words), "doc.pdf", page)
+    writer.close()
+
+    table = read_table(path)
+    assert table.schema.field("text").type == pa.string()
+    assert table.schema.field("conf").type == pa.int32()
+    assert table.column("text").to_pylist() == [word for words in pages for word in words]
+
+
+@pytest.mark.parametrize("ext", [".parquet", ".arrow"])
+def test_columnar_writer_no_words(tmp_path, ext):
+    path = str(tmp_path / ("boxes" + ext))
+    writer = ocr_tesseract.ColumnarWriter(path)
+    writer.write(page_boxes([]), "blank.png")
+    writer.close()
+    assert read_table(path).num_rows == 0
+
+
+def test_draw_bounding_boxes_on_grayscale_page(tmp_path):
+    import cv2
+    page = np.full((100, 200), 255, dtype=np.uint8)
+    data = {name: [10] for name in ocr_tesseract.BOX_DTYPE.names}
+    data.update(left=[20], top=[30], width=[50], height=[20], text=["word"], conf=[90])
+    path = str(tmp_path / "boxes.png")
+    ocr_tesseract.draw_bounding_boxes(page, data, path)
+
+    drawn = cv2.imread(path)
+    assert drawn.shape == (100, 200, 3)
+    # The box outline is green, not black
+    assert tuple(drawn[30, 40]) == (0, 255, 0)
+
+
+def test_tile_spans_absorb_small_remainder():
+    assert ocr_tesseract.tile_spans(2049, 2048, 200) == [(0, 2049)]
+    assert ocr_tesseract.tile_spans(4000, 2048, 200) == [(0, 2048), (1848, 2152)]
+    assert ocr_tesseract.tile_spans(4500, 2048, 200) == [(0, 2048), (1848, 2048), (2452, 2048)]
+    for length in range(100, 9000, 37):
+        spans = ocr_tesseract.tile_spans(length, 1024, 150)
+        assert spans[0][0] == 0 and sum(spans[-1]) == length
+        for (start, size), (next_start, _) in zip(spans, spans[1:]):
+            assert start + size - next_start >= 150
+
+
+def test_dedupe_boxes_keeps_most_confident_copy():
+    left = np.array([100, 102, 400, 100])
+    top = np.array([50, 50, 50, 300])
+    width = np.array([80, 78, 60, 80])
+    height = np.array([20, 20, 20, 20])
+    conf = np.array([70.0, 95.0, 90.0, 80.0])
+    assert sorted(ocr_tesseract.dedupe_boxes(left, top, width, height, conf).tolist()) == [1, 2, 3]
+
+
+def read_tsv(path):
+    """image_to_data(output_type=DICT) equivalent of a saved Tesseract TSV file."""
+    with open(path, encoding="utf-8") as f:
+        names = f.readline().rstrip("\n").split("\t")
+        data = {name: [] for name in names}
+        for line in f:
+            for name, value in zip(names, line.rstrip("\n").split("\t")):
+                data[name].append(value if name == "text" else int(value))
+    return data
+
+
+def test_text_from_data_matches_txt_renderer():
+    data = read_tsv(os.path.join(FIXTURES, "two_pages.tsv"))
+    with open(os.path.join(FIXTURES, "two_pages.txt"), encoding="utf-8", newline="") as f:
+        expected = f.read()
+    # Lines of a paragraph, a blank line between paragraphs and blocks, a form feed after each page
+    assert ocr_tesseract.text_from_data(data) == expected
@@ -0,0 +1,39 @@
+import io
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import vtt2txt  # noqa: E402
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "youtube_auto.vtt")
+
+
+def convert(fmt):
+    out = io.StringIO()
+    with vtt2txt.open_subtitles(FIXTURE) as lines:
+        vtt2txt.convert(lines, out, fmt)
+    return out.getvalue()
+
+
+def test_whitespace_line_does_not_end_cue():
+    with vtt2txt.open_subtitles(FIXTURE) as lines:
+        start, end, text = next(vtt2txt.iter_cues(lines))
+    assert (start, end) == (0.03, 2.27)
+    assert text == ["hello everyone and welcome"]
+
+
+def test_youtube_rolling_captions_jsonl():
+    records = [json.loads(line) for line in convert("jsonl").splitlines()]
+    assert records == [
+        {"start": 0.03, "end": 2.27, "text": "hello everyone and welcome"},
+        {"start": 2.28, "end": 5.43, "text": "to the show today we talk"},
+        {"start": 5.44, "end": 8.11, "text": "about captions and & subtitles"},
+    ]
+
+
+def test_youtube_rolling_captions_text():
+    assert convert("text") == ("hello everyone and welcome\n"
+                               "to the show today we talk\n"
+                               "about captions and & subtitles\n")
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+
+# Shared chunking and joining helpers for the TTS scripts
+# (openai_tts_from_file.py and google_cloud_ai/multi-speaker_markup_from_dialog_transcript.py).
+#
+# Long texts are synthesised as several requests whose audio is cached
+# per chunk. Chunk boundaries are pinned to "anchor" pieces picked by
+# their content hash, so an edit only moves the boundaries near it. The
+# chunk audio is joined without re-encoding: MP3 frame to frame after
+# dropping the ID3 tags of later parts, containers that cannot be
+# byte-joined by ffmpeg's concat demuxer with stream copy.
+
+import hashlib
+import os
+import subprocess
+import tempfile
+
+
+def is_anchor(text, every):
+    """Whether a chunk should always end after `text`; true for about 1 in `every` texts."""
+    return hashlib.sha256(text.encode()).digest()[0] % every == 0
+
+
+def strip_id3(data):
+    """Drop a leading ID3v2 tag so MP3 parts can be joined frame to frame."""
+    if data[:3] == b"ID3" and len(data) >= 10:
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        return data[10 + size:]
+    return data
+
+
+def ffmpeg_concat(parts, ext):
+    """Join audio byte strings of one container format (file extension `ext`) with ffmpeg, without re-encoding."""
+    with tempfile.TemporaryDirectory(prefix="tts_parts_") as tmp:
+        list_file = os.path.join(tmp, "list.txt")
+        with open(list_file, "w") as listing:
+            for i, part in enumerate(parts):
+                path = os.path.join(tmp, f"{i:05d}.{ext}")
+                with open(path, "wb") as f:
+                    f.write(part)
+                listing.write(f"file '{path}'\n")
+        joined = os.path.join(tmp, f"joined.{ext}")
+        subprocess.run(["ffmpeg", "-loglevel", "error", "-f", "concat", "-safe", "0",
+                        "-i", list_file, "-c", "copy", joined], check=True)
+        with open(joined, "rb") as f:
+            return f.read()
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+
+# Convert WebVTT/SRT subtitles to plain text, timestamped JSONL or
+# paragraphs.
+#
+# Cues are parsed lazily line by line, so memory stays constant however
+# large the input is. Rolling captions (as in YouTube's auto-generated
+# VTT) repeat the previous line(s) at the start of every cue, so each cue
+# is trimmed against the text already emitted: leading lines equal to the
+# last emitted lines are dropped, and so is a leading run of words (at
+# least --min-overlap) that repeats the tail of the emitted text.
+
+import argparse
+import html
+import json
+import os
+import re
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+TIMING = re.compile(r"((?:\d+:)?\d{1,2}:\d{2}[.,]\d{3})\s*-->\s*((?:\d+:)?\d{1,2}:\d{2}[.,]\d{3})")
+TAG = re.compile(r"<[^>]*>")
+
+# --format -> extension used with --to-files
+EXTENSIONS = {"text": ".txt", "jsonl": ".jsonl", "paragraphs": ".txt"}
+
+
+def parse_timestamp(stamp):
+    """Seconds from 'hh:mm:ss.mmm', 'mm:ss.mmm' or SRT 'hh:mm:ss,mmm'."""
+    seconds = 0.0
+    for part in stamp.replace(",", ".").split(":"):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+
+def clean(line):
+    """Strip markup (voice, class and inline timestamp tags) and entities from a cue line."""
+    return " ".join(html.unescape(TAG.sub("", line)).split())
+
+
+def iter_cues(lines):
+    """Yield (start, end, [text lines]) for each cue of a VTT or SRT stream."""
+    timing = None
+    text = []
+    for line in lines:
+        line = line.rstrip("\r\n")
+        match = TIMING.search(line)
+        if match:
+            if timing and text:
+                yield timing[0], timing[1], text
+            timing = (parse_timestamp(match.group(1)), parse_timestamp(match.group(2)))
+            text = []
+        elif not line:
+            # Only a truly empty line ends a cue; YouTube cues contain " " lines.
+            if timing and text:
+                yield timing[0], timing[1], text
+            timing = None
+            text = []
+        elif timing:
+            cleaned = clean(line)
+            if cleaned:
+                text.append(cleaned)
+    if timing and text:
+        yield timing[0], timing[1], text
+
+
+def dedupe_cues(cues, min_overlap=3, window=50):
+    """Yield (start, end, new text) with the rolling-window repetition of earlier cues removed.
+
+    Only the last few emitted lines and the last `window` words are kept,
+    so this runs in constant memory.
+    """
+    recent_lines = deque(maxlen=4)
+    recent_words = deque(maxlen=window)
+    for start, end, lines in cues:
+        # Drop leading lines that repeat the last emitted lines
+        for k in range(min(len(lines), len(recent_lines)), 0, -1):
+            if lines[:k] == list(recent_lines)[-k:]:
+                lines = lines[k:]
+                break
+        if not lines:
+            continue
+
+        # Drop a leading run of words repeating the tail of the emitted text
+        words = " ".join(lines).split()
+        tail = list(recent_words)
+        for k in range(min(len(words), len(tail)), min_overlap - 1, -1):
+            if words[:k] == tail[-k:]:
+                words = words[k:]
+                break
+        if not words:
+            continue
+
+        text = " ".join(words)
+        recent_lines.extend(lines)
+        recent_words.extend(words)
+        yield start, end, text
+
+
+def iter_paragraphs(pieces, gap=2.0):
+    """Merge deduplicated pieces into (start, end, paragraph), breaking at pauses longer than `gap` seconds."""
+    start = end = None
+    parts = []
+    for piece_start, piece_end, text in pieces:
+        if parts and piece_start - end > gap:
+            yield start, end, " ".join(parts)
+            parts = []
+        if not parts:
+            start = piece_start
+        parts.append(text)
+        end = piece_end
+    if parts:
+        yield start, end, " ".join(parts)
+
+
+def convert(lines, out, fmt="text", min_overlap=3, gap=2.0, source=None):
+    """Stream subtitles from `lines` to the file object `out` in the given format."""
+    pieces = dedupe_cues(iter_cues(lines), min_overlap)
+    if fmt == "paragraphs":
+        first = True
+        for _, _, paragraph in iter_paragraphs(pieces, gap):
+            out.write(("" if first else "\n") + paragraph + "\n")
+            first = False
+    elif fmt == "jsonl":
+        for start, end, text in pieces:
+            record = {"start": round(start, 3), "end": round(end, 3), "text": text}
+            if source is not None:
+                record["source"] = source
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+    else:
+        for _, _, text in pieces:
+            out.write(text + "\n")
+
+
+def open_subtitles(path):
+    return open(path, encoding="utf-8-sig", errors="replace")
+
+
+def convert_to_file(path, fmt, min_overlap, gap):
+    """Convert one file to a sibling output file; used by the process pool with --to-files."""
+    output = os.path.splitext(path)[0] + EXTENSIONS[fmt]
+    tmp = output + ".tmp"
+    with open_subtitles(path) as lines, open(tmp, "w", encoding="utf-8") as out:
+        convert(lines, out, fmt, min_overlap, gap)
+    os.replace(tmp, output)
+    return output
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert VTT/SRT subtitles to text, removing rolling-caption repetition. "
+                    "If no files are provided, reads from standard input.")
+    parser.add_argument("files", nargs="*", metavar="file", help="Subtitle files (.vtt or .srt)")
+    parser.add_argument("-f", "--format", choices=list(EXTENSIONS), default="text",
+                        help="text: one line per cue (default); jsonl: start/end/text records; "
+                             "paragraphs: text merged into paragraphs split at pauses")
+    parser.add_argument("-g", "--gap", type=float, default=2.0,
+                        help="Pause in seconds that starts a new paragraph with --format paragraphs (default: 2.0)")
+    parser.add_argument("--min-overlap", type=int, default=3,
+                        help="Shortest run of repeated words removed between cues (default: 3)")
+    parser.add_argument("-t", "--to-files", action="store_true",
+                        help="Write each input to a file next to it (.txt or .jsonl) instead of stdout, converting files in parallel")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count(),
+                        help="Worker processes with --to-files (default: number of CPU cores)")
+    args = parser.parse_args()
+
+    if not args.files:
+        convert(sys.stdin, sys.stdout, args.format, args.min_overlap, args.gap)
+        return
+
+    if args.to_files:
+        failed = False
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            futures = [executor.submit(convert_to_file, path, args.format, args.min_overlap, args.gap) for path in args.files]
+            for path, future in zip(args.files, futures):
+                try:
+                    print(future.result())
+                except Exception as e:
+                    print(f"ERROR: {path}: {e}", file=sys.stderr)
+                    failed = True
+        sys.exit(1 if failed else 0)
+
+    # stdout keeps the input order, so files are streamed one after another
+    for path in args.files:
+        with open_subtitles(path) as lines:
+            convert(lines, sys.stdout, args.format, args.min_overlap, args.gap,
+                    source=path if len(args.files) > 1 else None)
+
+
+if __name__ == "__main__":
+    main()
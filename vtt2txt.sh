@@ -1,12 +1,13 @@
 #!/bin/bash
 
-function vtt2txt() {
-    sed -e 's/<[^>]*>//g'  | sed '/^WEBVTT$/d' | sed -n '/-->/!p' | sed '/^\ *$/d'|uniq
-}
+# Runs vtt2txt.py, which streams cues, also reads SRT and removes the rolling
+# repetition of YouTube-style captions (not just adjacent duplicate lines).
+# All options are passed through, e.g. `vtt2txt.sh -f jsonl talk.vtt`.
 
 function usage() {
     echo "Usage: $0 [file ...]"
     echo "Converts VTT files to TXT. If no files are provided, reads from standard input."
+    echo "See '$(dirname "$0")/vtt2txt.py --help' for more options."
 }
 
 if [[ $1 == "-h" || $1 == "--help" ]]; then
@@ -14,10 +15,4 @@ if [[ $1 == "-h" || $1 == "--help" ]]; then
     exit 0
 fi
 
-if [[ $# -eq 0 ]]; then
-    vtt2txt
-else
-    for file in "$@"; do
-        vtt2txt < "$file"
-    done
-fi
+exec python3 "$(dirname "$(readlink -f "$0")")/vtt2txt.py" "$@"